@@ -1,7 +1,8 @@
 # Versão completa com integração CrewAI para processamento de análise financeira
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session, undefer, undefer_group
 from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
 import json
@@ -23,16 +24,22 @@ from crewai.tools import BaseTool
 from crew.tools import (
     BankStatementParserTool, 
     FinancialAdvisorTool,
-    DashboardDataCompilerTool
+    DashboardDataCompilerTool,
+    BLOCO_TAMANHO,
+    CREW_VERBOSE,
+    invalidate_profile_cache,
+    _dumps,
+    _loads
 )
 
 # Importações para autenticação
 from db.database import get_db
+from db.migrations import ensure_indexes
 from db.models import Usuario, FinancialProfile, LLMResponse
 from schemas.auth import UserRegister, TokenResponse, UserProfile as UserProfileSchema
 from schemas.financial import FinancialProfileCreate, FinancialProfileResponse, UploadResponse
 from schemas.llm import LLMComparisonResponse, LLMResponse as LLMResponseSchema
-from middleware.auth import hash_password, verify_password, create_access_token, get_current_user_id
+from middleware.auth import hash_password_async, verify_password_async, create_access_token, get_current_user_id
 
 # Configuração LLM 
 os.environ["OPENAI_API_KEY"] = "dummy"
@@ -43,7 +50,9 @@ os.environ["CREWAI_USE_LOCAL_LLM_ONLY"] = "true"
 app = FastAPI(
     title="Aconselhamento Financeiro com LLMs API - CrewAI Integration",
     description="API com integração completa do sistema de agentes CrewAI para análise financeira",
-    version="1.0.0"
+    version="1.0.0",
+    # Respostas serializadas com orjson (perfis, extratos e dashboards são grandes)
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS para React
@@ -56,6 +65,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def apply_migrations():
+    """Cria índices novos dos modelos em bancos já existentes (idempotente)"""
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print(f"⚠️ Não foi possível aplicar as migrações de índices: {e}")
+
 # ============================================================================
 # CLASSES CREWAI INTEGRADAS
 # ============================================================================
@@ -171,10 +188,10 @@ class FinancialAdvisorCrew:
                 "de consumo e categorizar transações bancárias de forma precisa e organizada. "
                 "Seu trabalho é a base para que o consultor financeiro possa gerar conselhos personalizados."
             ),
-            verbose=True,
+            verbose=CREW_VERBOSE,
             llm=self.llm,
             tools=[BankStatementParserTool()],
-            memory=True,
+            memory=False,
             allow_delegation=False,
             max_iter=1
         )
@@ -190,7 +207,7 @@ class FinancialAdvisorCrew:
                 "gerar conselhos. NUNCA invente ações como 'return the JSON content' ou "
                 "similares. Sua única ação válida é 'FinancialAdvisor'."
             ),
-            verbose=True,
+            verbose=CREW_VERBOSE,
             llm=self.llm,
             tools=[FinancialAdvisorTool()],
             allow_delegation=False,
@@ -211,7 +228,7 @@ class FinancialAdvisorCrew:
             "llm_enhanced": false,
             "categorization_method": "{categorization_method}",
             "ollama_model": "{selected_model}",
-            "block_size": 10
+            "block_size": {BLOCO_TAMANHO}
             }}
             Retorne APENAS o JSON gerado pela ferramenta como resultado final.
             """,
@@ -447,7 +464,7 @@ class FinancialAdvisorCrew:
                 process=Process.sequential,
                 llm=self.llm,
                 memory=False,
-                verbose=True
+                verbose=CREW_VERBOSE
             )
             
             extract_result_raw = extract_crew.kickoff()
@@ -519,7 +536,7 @@ class FinancialAdvisorCrew:
                 process=Process.sequential,
                 llm=self.llm,
                 memory=False,
-                verbose=True
+                verbose=CREW_VERBOSE
             )
             
             advice_result_raw = advice_crew.kickoff()
@@ -623,9 +640,9 @@ def save_llm_response_to_db(
         dashboard_data = crew_results.get("dashboard", {})
         
         # Preparar respostas para cada coluna específica
-        transactions_response = json.dumps(transactions_data, ensure_ascii=False, indent=2)
-        advice_response = json.dumps(advice_data, ensure_ascii=False, indent=2)
-        dashboard_response = json.dumps(dashboard_data, ensure_ascii=False, indent=2)
+        transactions_response = _dumps(transactions_data, pretty=True)
+        advice_response = _dumps(advice_data, pretty=True)
+        dashboard_response = _dumps(dashboard_data, pretty=True)
         
         # Preparar métricas de qualidade e comparação
         score_metrics = {
@@ -683,14 +700,16 @@ def save_llm_response_to_db(
             transactions_response=transactions_response,
             advice_response=advice_response,
             dashboard_response=dashboard_response,
-            score=json.dumps(score_metrics, ensure_ascii=False, indent=2)
+            score=_dumps(score_metrics, pretty=True)
         )
         
+        # flush() já traz o id do INSERT; sem refresh() (um SELECT extra) após o commit
         db.add(llm_response_entry)
+        db.flush()
+        llm_response_id = llm_response_entry.id
         db.commit()
-        db.refresh(llm_response_entry)
         
-        print(f"✅ LLM Response salva no banco com nova estrutura: ID {llm_response_entry.id}")
+        print(f"✅ LLM Response salva no banco com nova estrutura: ID {llm_response_id}")
         print(f"📊 Modelo IA: {modelo_ia}")
         print(f"📈 Transações: {len(transactions_data.get('transacoes', []))} registros")
         print(f"💡 Conselhos: {'✅' if advice_data.get('resumo') else '❌'}")
@@ -761,7 +780,7 @@ async def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
             )
         
         # Criar novo usuário
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await hash_password_async(user_data.password)
         new_user = Usuario(
             nome=user_data.name,
             email=user_data.email,
@@ -830,7 +849,7 @@ async def login_user(request: Request, db: Session = Depends(get_db)):
         # Buscar usuário por email
         user = db.query(Usuario).filter(Usuario.email == email).first()
         
-        if not user or not verify_password(password, user.password):
+        if not user or not await verify_password_async(password, user.password):
             raise HTTPException(
                 status_code=401,
                 detail="Email ou senha incorretos"
@@ -918,7 +937,7 @@ async def check_analysis_status(
             }
         
         # Buscar análise mais recente
-        latest_analysis = db.query(LLMResponse).filter(
+        latest_analysis = db.query(LLMResponse).options(undefer(LLMResponse.dashboard_response)).filter(
             LLMResponse.perfil_financeiro_id == profile.id
         ).order_by(LLMResponse.data_criado.desc()).first()
         
@@ -984,8 +1003,8 @@ async def create_financial_profile(
         
         if existing_profile:
             # Atualizar perfil existente
-            existing_profile.questionnaire_data = json.dumps(questionnaire_dict, ensure_ascii=False)
-            existing_profile.objetivo = json.dumps(objective_dict, ensure_ascii=False)
+            existing_profile.questionnaire_data = _dumps(questionnaire_dict)
+            existing_profile.objetivo = _dumps(objective_dict)
             
             db.commit()
             db.refresh(existing_profile)
@@ -994,9 +1013,9 @@ async def create_financial_profile(
             # Criar novo perfil
             new_profile = FinancialProfile(
                 usuario_id=current_user_id,
-                questionnaire_data=json.dumps(questionnaire_dict, ensure_ascii=False),
-                objetivo=json.dumps(objective_dict, ensure_ascii=False),
-                extrato=json.dumps({}, ensure_ascii=False)  # Extrato vazio inicialmente
+                questionnaire_data=_dumps(questionnaire_dict),
+                objetivo=_dumps(objective_dict),
+                extrato=_dumps({})  # Extrato vazio inicialmente
             )
             
             db.add(new_profile)
@@ -1004,13 +1023,16 @@ async def create_financial_profile(
             db.refresh(new_profile)
             profile = new_profile
         
+        # Perfis lidos pelas tools ficam em cache por processo
+        invalidate_profile_cache(current_user_id)
+        
         # Preparar resposta
         return {
             "id": profile.id,
             "usuario_id": profile.usuario_id,
-            "questionnaire_data": json.loads(profile.questionnaire_data),
-            "objetivo": json.loads(profile.objetivo) if profile.objetivo else None,
-            "extrato": json.loads(profile.extrato) if profile.extrato else None,
+            "questionnaire_data": _loads(profile.questionnaire_data),
+            "objetivo": _loads(profile.objetivo) if profile.objetivo else None,
+            "extrato": _loads(profile.extrato) if profile.extrato else None,
             "data_criado": profile.data_criado.isoformat()
         }
         
@@ -1027,7 +1049,7 @@ async def get_financial_profile(
 ):
     """Retorna o perfil financeiro do usuário"""
     try:
-        profile = db.query(FinancialProfile).filter(
+        profile = db.query(FinancialProfile).options(undefer_group("payload")).filter(
             FinancialProfile.usuario_id == current_user_id
         ).first()
         
@@ -1040,9 +1062,9 @@ async def get_financial_profile(
         return {
             "id": profile.id,
             "usuario_id": profile.usuario_id,
-            "questionnaire_data": json.loads(profile.questionnaire_data),
-            "objetivo": json.loads(profile.objetivo) if profile.objetivo else None,
-            "extrato": json.loads(profile.extrato) if profile.extrato else None,
+            "questionnaire_data": _loads(profile.questionnaire_data),
+            "objetivo": _loads(profile.objetivo) if profile.objetivo else None,
+            "extrato": _loads(profile.extrato) if profile.extrato else None,
             "data_criado": profile.data_criado.isoformat()
         }
         
@@ -1051,6 +1073,10 @@ async def get_financial_profile(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
 
+# Extensões aceitas no upload (ordem só para a mensagem de erro)
+UPLOAD_EXTENSIONS_ORDER = ('.csv', '.xlsx', '.xls', '.ofx', '.pdf')
+UPLOAD_EXTENSIONS = frozenset(UPLOAD_EXTENSIONS_ORDER)
+
 @app.post("/api/upload-extract", response_model=UploadResponse)
 async def upload_bank_statement(
     file: UploadFile = File(...),
@@ -1060,13 +1086,12 @@ async def upload_bank_statement(
     """Upload e processamento de extrato bancário"""
     try:
         # Validar tipo de arquivo
-        allowed_extensions = ['.csv', '.xlsx', '.xls', '.ofx', '.pdf']
         file_extension = os.path.splitext(file.filename)[1].lower()
         
-        if file_extension not in allowed_extensions:
+        if file_extension not in UPLOAD_EXTENSIONS:
             raise HTTPException(
                 status_code=400,
-                detail=f"Tipo de arquivo não suportado. Use: {', '.join(allowed_extensions)}"
+                detail=f"Tipo de arquivo não suportado. Use: {', '.join(UPLOAD_EXTENSIONS_ORDER)}"
             )
         
         # Criar diretório de upload se não existir
@@ -1093,7 +1118,7 @@ async def upload_bank_statement(
         }
         
         # Buscar perfil financeiro do usuário
-        profile = db.query(FinancialProfile).filter(
+        profile = db.query(FinancialProfile).options(undefer_group("payload")).filter(
             FinancialProfile.usuario_id == current_user_id
         ).first()
         
@@ -1106,9 +1131,10 @@ async def upload_bank_statement(
                 "processed_at": None
             }
             
-            profile.extrato = json.dumps(extrato_data, ensure_ascii=False)
+            profile.extrato = _dumps(extrato_data)
             db.commit()
             profile_updated = True
+            invalidate_profile_cache(current_user_id)
         
         return {
             "message": "Arquivo enviado com sucesso",
@@ -1129,7 +1155,7 @@ async def get_processing_status(
 ):
     """Retorna o status de processamento do perfil financeiro"""
     try:
-        profile = db.query(FinancialProfile).filter(
+        profile = db.query(FinancialProfile).options(undefer_group("payload")).filter(
             FinancialProfile.id == profile_id,
             FinancialProfile.usuario_id == current_user_id
         ).first()
@@ -1184,7 +1210,7 @@ async def analyze_financial_data_with_crewai(
 
     try:
         # Buscar perfil financeiro do usuário
-        profile = db.query(FinancialProfile).filter(
+        profile = db.query(FinancialProfile).options(undefer_group("payload")).filter(
             FinancialProfile.usuario_id == current_user_id
         ).first()
         
@@ -1195,7 +1221,7 @@ async def analyze_financial_data_with_crewai(
             )
 
         # Verificar se há extrato carregado
-        extrato_data = json.loads(profile.extrato) if profile.extrato else {}
+        extrato_data = _loads(profile.extrato) if profile.extrato else {}
         if not extrato_data.get("file_info"):
             raise HTTPException(
                 status_code=400,
@@ -1211,8 +1237,8 @@ async def analyze_financial_data_with_crewai(
             )
 
         # Preparar dados do usuário conforme estrutura do frontend
-        questionnaire_data = json.loads(profile.questionnaire_data) if profile.questionnaire_data else {}
-        objetivo_data = json.loads(profile.objetivo) if profile.objetivo else {}
+        questionnaire_data = _loads(profile.questionnaire_data) if profile.questionnaire_data else {}
+        objetivo_data = _loads(profile.objetivo) if profile.objetivo else {}
         
         print(f"🔍 DEBUG - Questionnaire data: {questionnaire_data}")
         print(f"🔍 DEBUG - Objetivo data: {objetivo_data}")
@@ -1338,7 +1364,7 @@ async def get_financial_analysis(
             )
         
         # Buscar a resposta LLM mais recente para este perfil
-        latest_llm_response = db.query(LLMResponse).filter(
+        latest_llm_response = db.query(LLMResponse).options(undefer_group("payload")).filter(
             LLMResponse.perfil_financeiro_id == profile.id
         ).order_by(LLMResponse.data_criado.desc()).first()
         
@@ -1350,10 +1376,10 @@ async def get_financial_analysis(
         
         # Extrair dados das colunas da tabela llm_responses
         try:
-            transactions_data = json.loads(latest_llm_response.transactions_response)
-            advice_data = json.loads(latest_llm_response.advice_response)
-            dashboard_data = json.loads(latest_llm_response.dashboard_response)
-            quality_metrics = json.loads(latest_llm_response.score)
+            transactions_data = _loads(latest_llm_response.transactions_response)
+            advice_data = _loads(latest_llm_response.advice_response)
+            dashboard_data = _loads(latest_llm_response.dashboard_response)
+            quality_metrics = _loads(latest_llm_response.score)
             
             # Estruturar resposta completa para o dashboard
             dashboard_response = {
@@ -1403,7 +1429,7 @@ async def get_analysis_status(
         if user_id != current_user_id:
             raise HTTPException(status_code=403, detail="Acesso negado")
         
-        profile = db.query(FinancialProfile).filter(
+        profile = db.query(FinancialProfile).options(undefer_group("payload")).filter(
             FinancialProfile.usuario_id == user_id
         ).first()
         
@@ -1415,7 +1441,7 @@ async def get_analysis_status(
                 created_at=datetime.now().isoformat()
             )
         
-        extrato_data = json.loads(profile.extrato) if profile.extrato else {}
+        extrato_data = _loads(profile.extrato) if profile.extrato else {}
         analysis_results = extrato_data.get("analysis_results")
         
         if not analysis_results:
@@ -1467,7 +1493,7 @@ async def get_llm_responses(
             )
         
         # Buscar respostas LLM mais recentes para este perfil
-        llm_responses = db.query(LLMResponse).filter(
+        llm_responses = db.query(LLMResponse).options(undefer_group("payload")).filter(
             LLMResponse.perfil_financeiro_id == profile_id
         ).order_by(LLMResponse.data_criado.desc()).limit(5).all()
         
@@ -1484,10 +1510,10 @@ async def get_llm_responses(
                 "id": llm_resp.id,
                 "timestamp": llm_resp.data_criado.isoformat(),
                 "modelo_ia": llm_resp.modelo_ia,
-                "transactions_response": json.loads(llm_resp.transactions_response),
-                "advice_response": json.loads(llm_resp.advice_response),
-                "dashboard_response": json.loads(llm_resp.dashboard_response),
-                "score_metrics": json.loads(llm_resp.score)
+                "transactions_response": _loads(llm_resp.transactions_response),
+                "advice_response": _loads(llm_resp.advice_response),
+                "dashboard_response": _loads(llm_resp.dashboard_response),
+                "score_metrics": _loads(llm_resp.score)
             }
             responses_data.append(response_data)
         
@@ -1522,7 +1548,7 @@ async def get_latest_llm_response(
             )
         
         # Buscar resposta LLM mais recente
-        latest_llm_response = db.query(LLMResponse).filter(
+        latest_llm_response = db.query(LLMResponse).options(undefer_group("payload")).filter(
             LLMResponse.perfil_financeiro_id == profile.id
         ).order_by(LLMResponse.data_criado.desc()).first()
         
@@ -1537,10 +1563,10 @@ async def get_latest_llm_response(
             "analysis_id": latest_llm_response.id,
             "timestamp": latest_llm_response.data_criado.isoformat(),
             "modelo_ia": latest_llm_response.modelo_ia,
-            "transactions_response": json.loads(latest_llm_response.transactions_response),
-            "advice_response": json.loads(latest_llm_response.advice_response),
-            "dashboard_response": json.loads(latest_llm_response.dashboard_response),
-            "quality_metrics": json.loads(latest_llm_response.score)
+            "transactions_response": _loads(latest_llm_response.transactions_response),
+            "advice_response": _loads(latest_llm_response.advice_response),
+            "dashboard_response": _loads(latest_llm_response.dashboard_response),
+            "quality_metrics": _loads(latest_llm_response.score)
         }
         
     except HTTPException:
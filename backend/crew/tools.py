@@ -12,7 +12,8 @@ advisory application that:
 
 Notes
 -----
-- No external SaaS APIs are used. The LocalLLMClient can invoke a local
+- No external SaaS APIs are used. The LocalLLMClient talks to a local Ollama
+  server over its HTTP API (with JSON-constrained output), or can invoke a local
   inference binary via subprocess (e.g., `ollama`, `llama.cpp`, `text-generation-inference` CLI),
   or any CLI you expose that prints model output to STDOUT.
 - All tools return JSON strings for easy handoff between agents.
@@ -24,15 +25,33 @@ from __future__ import annotations
 
 import os
 import re
+import atexit
+import hashlib
+import sqlite3
 import json
 import csv
+import logging
 import math
+import heapq
 import shlex
 import pickle
 import pathlib
 import datetime as dt
+import socket
 import subprocess
-from typing import Any, Dict, List, Optional, Tuple, ClassVar, Union
+import tempfile
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import Counter
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import islice
+from types import MappingProxyType
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, ClassVar, Union
 
 # CrewAI BaseTool
 try:
@@ -46,18 +65,28 @@ except Exception:  # Fallback stub for linting/tests if crewai isn't installed y
 
 # Pydantic for arg schemas (nice in CrewAI UIs)
 try:
-    from pydantic import BaseModel, Field
+    from pydantic import BaseModel, Field, PrivateAttr
 except Exception:  # minimal shim
     class BaseModel:  # type: ignore
         def __init__(self, **data): self.__dict__.update(data)
     def Field(default=None, description: str = "", example: Any = None):
         return default
+    def PrivateAttr(default=None, default_factory=None):
+        return default_factory() if default_factory else default
+
+# pydantic v2: parse + validação de JSON num único passo no pydantic-core (Rust)
+try:
+    from pydantic import TypeAdapter
+except Exception:
+    TypeAdapter = None
 
 # Pandas is used for tabular processing
 try:
     import pandas as pd
+    import numpy as np
 except Exception:
     pd = None  # tools will degrade gracefully if pandas isn't present
+    np = None
 
 
 # Optional: langchain_ollama for enhanced LLM categorization
@@ -70,27 +99,230 @@ except Exception:
     HumanMessage = None
     tqdm = None
 
+# Optional: rapidfuzz para casamento aproximado (implementação em C) das respostas do LLM
+try:
+    from rapidfuzz import process as fuzz_process, fuzz
+except Exception:
+    fuzz_process = None
+    fuzz = None
+
+# Optional: cachetools para cache com expiração (TTL) das respostas do banco
+try:
+    from cachetools import TTLCache
+except Exception:
+    TTLCache = None
+
+# Optional: pyarrow para leitura de CSV multi-thread
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except Exception:
+    pa = None
+    pa_csv = None
+
+# Optional: pyahocorasick para varrer todas as palavras-chave de categoria numa única passada
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+
+# Optional: requests para sessão HTTP persistente com o Ollama
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except Exception:
+    requests = None
+    HTTPAdapter = None
+
+# Optional: orjson para (de)serialização rápida dos payloads JSON das tools
+try:
+    import orjson
+except Exception:
+    orjson = None
+
 # ----------------------------------------------------------------------------
 # Utilities
 # ----------------------------------------------------------------------------
 
+# Logs verbosos (dumps de contexto/respostas do LLM) só com DEBUG_TOOLS definido
+DEBUG_TOOLS = bool(os.getenv("DEBUG_TOOLS"))
+
+# verbose dos Agents/Crews (renderização token a token no terminal) só em desenvolvimento
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "0") == "1"
+
+# Máximo de análises (kickoffs) simultâneas por processo; acima disso o Ollama só enfileira
+CREW_MAX_PARALLEL = int(os.getenv("CREW_MAX_PARALLEL", "4"))
+
+logger = logging.getLogger(__name__)
+
+_NOW_ISO_CACHE: Tuple[int, str] = (0, "")
+
 def _now_iso() -> str:
-    return dt.datetime.now().isoformat()
+    """Timestamp ISO com resolução de segundo, reaproveitado dentro do mesmo segundo."""
+    global _NOW_ISO_CACHE
+    sec = int(time.time())
+    cached = _NOW_ISO_CACHE
+    if cached[0] != sec:
+        cached = _NOW_ISO_CACHE = (sec, dt.datetime.fromtimestamp(sec).isoformat())
+    return cached[1]
+
+def _abs_val(t: dict) -> float:
+    """Valor absoluto de uma transação (chave para top-N por movimentação)."""
+    return abs(float(t.get("valor", 0) or 0))
+
+def _top_k_abs_indices(abs_vals, k: int = 5) -> list:
+    """Índices dos k maiores de um array NumPy, com empates resolvidos pela posição (como no nlargest)."""
+    n = len(abs_vals)
+    if n > k:
+        # k-ésimo maior valor via partition (O(N)); só os candidatos são ordenados
+        corte = np.partition(abs_vals, n - k)[n - k]
+        candidatos = np.flatnonzero(abs_vals >= corte)
+    else:
+        candidatos = np.arange(n)
+    return candidatos[np.argsort(-abs_vals[candidatos], kind="stable")][:k].tolist()
+
+def _json_default(obj: Any) -> Any:
+    """Converte tipos não suportados nativamente (numpy, datas, mappings) para JSON."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if hasattr(obj, "item"):  # escalares numpy
+        return obj.item()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+def _dumps(obj: Any, pretty: bool = False) -> str:
+    """json.dumps(ensure_ascii=False) usando orjson quando disponível (pretty=True indenta com 2 espaços)."""
+    if orjson is not None:
+        return _dumpb(obj, pretty).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=_json_default, indent=2 if pretty else None)
+
+def _dumpb(obj: Any, pretty: bool = False) -> bytes:
+    """Como _dumps, mas devolve bytes UTF-8 (o formato nativo do orjson, ideal para arquivos)."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_json_default, option=option)
+    return _dumps(obj, pretty).encode("utf-8")
+
+def _loads(data: Union[str, bytes]) -> Any:
+    """json.loads usando orjson quando disponível (NaN/Infinity caem no json padrão)."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
 
 class JSONableError(Exception):
     pass
 
+class _PromptCache:
+    """Cache persistente (SQLite) de respostas do LLM, indexado por sha256(modelo, format, prompt).
+
+    Entradas expiram após `ttl` segundos e a tabela é podada para no máximo `max_rows`
+    linhas (as mais antigas saem primeiro). Falhas de disco não interrompem a geração:
+    o cache apenas se desativa.
+    """
+    # A poda roda a cada N gravações, não em todas
+    PRUNE_EVERY = 64
+
+    def __init__(self, path: str, ttl: float, max_rows: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+        self._puts = 0
+
+    @staticmethod
+    def key(model: str, prompt: str, format: Union[str, dict, None]) -> bytes:
+        fmt = _dumps(format) if isinstance(format, dict) else str(format or "")
+        return hashlib.sha256(f"{model}\x00{fmt}\x00{prompt}".encode("utf-8")).digest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (k BLOB PRIMARY KEY, out TEXT NOT NULL, created REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_created ON llm_cache (created)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: bytes) -> Optional[str]:
+        if self._disabled:
+            return None
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT out FROM llm_cache WHERE k = ? AND created >= ?", (key, time.time() - self.ttl)
+                ).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+
+    def put(self, key: bytes, out: str) -> None:
+        if self._disabled:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                now = time.time()
+                conn.execute("INSERT OR REPLACE INTO llm_cache (k, out, created) VALUES (?, ?, ?)", (key, out, now))
+                self._puts += 1
+                if self._puts % self.PRUNE_EVERY == 0:
+                    self._prune(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        """Remove entradas expiradas e o excedente acima de max_rows (chamado com o lock)."""
+        conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE k IN (SELECT k FROM llm_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def _disable(self, error: Exception) -> None:
+        print(f"[WARNING] Cache de prompts do LLM desativado ({self.path}): {error}")
+        self._disabled = True
+
+    def close(self) -> None:
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+# Respostas do LLM reaproveitadas entre execuções: opt-in (LLM_CACHE=1), pois uma resposta
+# amostrada passa a valer para o mesmo prompt até expirar
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(__file__), "..", "llm_cache.sqlite3"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 60 * 60)))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "5000"))
+
 class LocalLLMClient:
-    """Simple local LLM client that shells out to a command-line runner.
+    """Simple local LLM client for Ollama (HTTP API) or a command-line runner.
 
     You can configure via environment variables:
+      - OLLAMA_BASE_URL: Ollama server (default "http://localhost:11434"), used
+                 through POST /api/generate, which supports `format` (JSON mode)
       - LLM_CMD: Full command template, e.g. "ollama run {model} --prompt {prompt}"
-                 or "./main -m models/model.gguf -p {prompt}"
+                 or "./main -m models/model.gguf -p {prompt}". When set, the
+                 subprocess runner is used instead of the HTTP API.
+      - OLLAMA_KEEP_ALIVE: How long Ollama keeps the model loaded after a
+                 request (default "1h"), so tool calls don't pay a cold load
       - LLM_MODEL: Default model name/tag (e.g., "llama3:8b")
-      - LLM_TIMEOUT: Seconds before killing the subprocess (str -> int)
-
-    Alternatively, pass a custom `cmd_template` at init time.
-    The template must contain "{prompt}" and may contain "{model}".
+      - LLM_TIMEOUT: Seconds before giving up on a generation (str -> int)
+      - LLM_CACHE / LLM_CACHE_PATH: "1" enables the on-disk prompt cache (off by
+                 default); the path defaults to backend/llm_cache.sqlite3
+      - LLM_CACHE_TTL / LLM_CACHE_MAX_ROWS: entry lifetime in seconds (default 24h)
+                 and row cap (default 5000) of that cache
+
+    The command template may contain "{prompt}" and "{model}"; without "{prompt}",
+    the prompt is written to the command's stdin.
     """
     def __init__(self,
                  cmd_template: Optional[str] = None,
@@ -98,24 +330,66 @@ class LocalLLMClient:
                  timeout: Optional[int] = None):
         #self.cmd_template = cmd_template or os.getenv("LLM_CMD", "ollama run {model} --prompt {prompt}")
         self.cmd_template = os.getenv("LLM_CMD", "ollama run {model} {prompt}")
+        self.use_cli = bool(os.getenv("LLM_CMD"))
+        self.base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "1h")
+        # Sessão HTTP persistente (keep-alive); sem requests, cai para urllib por chamada
+        self.session = None
+        if requests is not None and not self.use_cli:
+            self.session = requests.Session()
+            self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
         self.default_model = default_model or os.getenv("LLM_MODEL", "gemma3")
         self.timeout = timeout or int(os.getenv("LLM_TIMEOUT", "120"))
+        # Template quebrado em argv uma única vez; {prompt}/{model} resolvidos por argumento
+        self._argv_tmpl = shlex.split(self.cmd_template)
+        # Gerações HTTP em andamento, por (modelo, prompt, format): chamadas idênticas
+        # simultâneas esperam a mesma resposta em vez de repetir a requisição
+        self._inflight: Dict[Tuple[str, str, str], Future] = {}
+        self._inflight_lock = threading.Lock()
+        self.cache = (
+            _PromptCache(LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ROWS)
+            if os.getenv("LLM_CACHE", "0") == "1" else None
+        )
 
-    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+    def generate(self, prompt: str, model: Optional[str] = None, format: Union[str, dict, None] = None,
+                 no_cache: bool = False) -> str:
+        """
+        Gera uma resposta. `format` ("json" ou um JSON schema) ativa a decodificação
+        restrita do Ollama; é ignorado pelo runner de linha de comando.
+
+        Com LLM_CACHE=1, prompts idênticos (mesmo modelo e format) são respondidos pelo
+        cache em disco; no_cache=True força uma nova geração e regrava a entrada.
+        """
         model = model or self.default_model
-        if "{prompt}" not in self.cmd_template:
-            raise JSONableError("cmd_template deve conter {prompt}")
+        key = _PromptCache.key(model, prompt, format) if self.cache is not None else None
+        if key is not None and not no_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if DEBUG_TOOLS:
+                    print(f"[DEBUG] Resposta do LLM reaproveitada do cache (model={model}, prompt={len(prompt)} chars)")
+                return cached
+
+        if self.use_cli:
+            output = self._generate_cli(prompt, model)
+        else:
+            output = self._generate_http(prompt, model, format)
+        if key is not None and output:
+            self.cache.put(key, output)
+        return output
 
-        # Escapar o prompt adequadamente para Windows
-        escaped_prompt = prompt.replace('"', '\\"').replace('\n', '\\n')
-        cmd = self.cmd_template.format(prompt=f'"{escaped_prompt}"', model=model)
-        print(f"\n[DEBUG] Executando comando LLM:\n{cmd}\n")
+    def _generate_cli(self, prompt: str, model: str) -> str:
+        # Sem shell: o prompt vai como um único argumento, sem necessidade de escapar aspas;
+        # templates sem {prompt} recebem o prompt pela entrada padrão
+        prompt_via_stdin = "{prompt}" not in self.cmd_template
+        argv = [a.format(prompt=prompt, model=model) for a in self._argv_tmpl]
+        print(f"\n[DEBUG] Executando comando LLM: {' '.join(self._argv_tmpl)} (model={model}, prompt={len(prompt)} chars)\n")
 
         try:
             # Forçar codificação UTF-8 no Windows
             proc = subprocess.run(
-                cmd, 
-                shell=True, 
+                argv, 
+                shell=False, 
+                input=prompt if prompt_via_stdin else None,
                 capture_output=True, 
                 text=True, 
                 timeout=self.timeout,
@@ -124,6 +398,8 @@ class LocalLLMClient:
             )
         except subprocess.TimeoutExpired:
             raise JSONableError("Local LLM timed out")
+        except OSError as e:
+            raise JSONableError(f"Local LLM failed: {e}")
 
         if proc.returncode != 0:
             error_msg = proc.stderr.strip() if proc.stderr else "Erro desconhecido"
@@ -133,6 +409,146 @@ class LocalLLMClient:
         print(f"[DEBUG] Saída bruta do modelo (primeiros 300 chars):\n{output[:300]}\n")
         return output
 
+    def generate_batch(self, prompts: List[str], model: Optional[str] = None,
+                       format: Union[str, dict, None] = None, max_workers: int = 4,
+                       return_exceptions: bool = False, no_cache: bool = False) -> List[Any]:
+        """
+        Gera respostas para vários prompts, na ordem recebida. No modo HTTP as chamadas
+        saem em paralelo pela mesma sessão keep-alive (o Ollama atende até
+        OLLAMA_NUM_PARALLEL por vez); no runner de linha de comando seguem em série.
+        Com return_exceptions=True, a exceção de um prompt volta na posição dele.
+        """
+        def one(prompt: str) -> Any:
+            try:
+                return self.generate(prompt, model=model, format=format, no_cache=no_cache)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        if not prompts:
+            return []
+        if self.use_cli or len(prompts) == 1:
+            return [one(p) for p in prompts]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as ex:
+            return list(ex.map(one, prompts))
+
+    def _generate_http(self, prompt: str, model: str, format: Union[str, dict, None]) -> str:
+        key = (model, prompt, _dumps(format) if isinstance(format, dict) else str(format))
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            if DEBUG_TOOLS:
+                print(f"[DEBUG] Ollama /api/generate: aguardando requisição idêntica em andamento (model={model})")
+            return future.result()
+
+        try:
+            output = self._request_generate(prompt, model, format)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(output)
+            return output
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _request_generate(self, prompt: str, model: str, format: Union[str, dict, None]) -> str:
+        payload: Dict[str, Any] = {"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive}
+        if format:
+            payload["format"] = format
+        print(f"\n[DEBUG] Ollama /api/generate (model={model}, format={'schema' if isinstance(format, dict) else format}, prompt={len(prompt)} chars)\n")
+
+        data = self._post("/api/generate", payload)
+        if data.get("error"):
+            raise JSONableError(f"Local LLM failed: {data['error']}")
+
+        output = (data.get("response") or "").strip()
+        print(f"[DEBUG] Saída bruta do modelo (primeiros 300 chars):\n{output[:300]}\n")
+        return output
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST JSON no Ollama; usa a sessão keep-alive do requests quando disponível."""
+        body = _dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.session is not None:
+            try:
+                resp = self.session.post(f"{self.base_url}{path}", data=body, headers=headers, timeout=self.timeout)
+            except requests.Timeout:
+                raise JSONableError("Local LLM timed out")
+            except requests.RequestException as e:
+                raise JSONableError(f"Local LLM failed: {e}")
+            raw = resp.content
+        else:
+            req = urllib.request.Request(f"{self.base_url}{path}", data=body, headers=headers)
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    raw = resp.read()
+            except socket.timeout:
+                raise JSONableError("Local LLM timed out")
+            except (urllib.error.URLError, OSError) as e:
+                raise JSONableError(f"Local LLM failed: {e}")
+        try:
+            return _loads(raw)
+        except ValueError as e:
+            raise JSONableError(f"Local LLM failed: invalid response ({e})")
+
+    def close(self) -> None:
+        """Fecha a sessão HTTP (conexões keep-alive com o Ollama) e o cache; idempotente."""
+        session, self.session = self.session, None
+        if session is not None:
+            session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def warm_up(self, model: Optional[str] = None, background: bool = True) -> None:
+        """
+        Carrega o modelo no Ollama (requisição sem prompt) uma vez por processo, para que a
+        primeira geração não pague o carregamento dos pesos. Em background por padrão.
+        """
+        if self.use_cli:
+            return
+        model = model or self.default_model
+        with _WARM_LOCK:
+            if model in _WARMED_MODELS:
+                return
+            _WARMED_MODELS.add(model)
+
+        def load():
+            try:
+                self._post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+                print(f"[INFO] Modelo {model} pré-carregado no Ollama")
+            except Exception as e:
+                print(f"[WARNING] Não foi possível pré-carregar o modelo {model}: {e}")
+                with _WARM_LOCK:
+                    _WARMED_MODELS.discard(model)
+
+        if background:
+            threading.Thread(target=load, name=f"ollama-warmup-{model}", daemon=True).start()
+        else:
+            load()
+
+# Modelos já pré-carregados neste processo (LocalLLMClient.warm_up)
+_WARMED_MODELS: set = set()
+_WARM_LOCK = threading.Lock()
+
+_LLM_CLIENT: Optional[LocalLLMClient] = None
+_LLM_CLIENT_LOCK = threading.Lock()
+
+def get_llm_client() -> LocalLLMClient:
+    """Cliente LLM compartilhado pelo processo (reaproveita a sessão HTTP entre as tools)."""
+    global _LLM_CLIENT
+    if _LLM_CLIENT is None:
+        with _LLM_CLIENT_LOCK:
+            if _LLM_CLIENT is None:
+                _LLM_CLIENT = LocalLLMClient()
+                atexit.register(_LLM_CLIENT.close)
+    return _LLM_CLIENT
+
 # ----------------------------------------------------------------------------
 # Database Access Integration
 # ----------------------------------------------------------------------------
@@ -142,13 +558,25 @@ try:
     import sys
     import os
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-    from db.database import SessionLocal
+    from sqlalchemy import func
+    from sqlalchemy.orm import undefer
+    from db.database import SessionLocal, ScopedSession
     from db.models import FinancialProfile
 except ImportError:
     # Fallback quando database não está disponível
+    func = None
+    undefer = None
     SessionLocal = None
+    ScopedSession = None
     FinancialProfile = None
 
+# Tabela de tradução para remover null bytes dos JSONs gravados no banco
+_NULL_TRANS = str.maketrans("", "", "\x00")
+
+# JSON final por usuario_id: vários agentes da mesma crew consultam o mesmo perfil
+_PROFILE_RESULT_CACHE = TTLCache(maxsize=1024, ttl=60) if TTLCache is not None else None
+_PROFILE_RESULT_LOCK = threading.Lock()
+
 class DatabaseFinancialProfileArgs(BaseModel):
     usuario_id: int = Field(description="ID do usuário para buscar dados financeiros")
 
@@ -159,6 +587,9 @@ class DatabaseFinancialProfileTool(BaseTool):
         "incluindo dados do questionário e objetivos financeiros da tabela perfil_financeiro."
     )
 
+    # Perfis pré-carregados em lote via get_latest_profiles (consumidos uma vez por _run)
+    _profile_cache: Dict[int, Any] = PrivateAttr(default_factory=dict)
+
     def _run(self, usuario_id: int) -> str:
         """
         Busca dados do perfil financeiro de um usuário no banco de dados.
@@ -175,13 +606,19 @@ class DatabaseFinancialProfileTool(BaseTool):
                 "Database connection not available. Please configure database components."
             )
 
-        db_session = None
+        if _PROFILE_RESULT_CACHE is not None:
+            with _PROFILE_RESULT_LOCK:
+                cached = _PROFILE_RESULT_CACHE.get(usuario_id)
+            if cached is not None:
+                return cached
+
         try:
-            # Criar sessão do banco
-            db_session = SessionLocal()
-            
-            # Buscar perfil financeiro mais recente do usuário
-            profile = self._get_latest_profile(db_session, usuario_id)
+            # Usar perfil pré-carregado em lote, se houver
+            profile = self._profile_cache.pop(usuario_id, None)
+
+            if profile is None:
+                # Buscar perfil financeiro mais recente do usuário
+                profile = self._get_latest_profile(usuario_id)
             
             if not profile:
                 return self._create_error_response(
@@ -191,33 +628,73 @@ class DatabaseFinancialProfileTool(BaseTool):
             # Processar dados do perfil
             processed_data = self._process_profile_data(profile)
             
-            return json.dumps(processed_data, ensure_ascii=False)
+            result = _dumps(processed_data)
+            if _PROFILE_RESULT_CACHE is not None:
+                with _PROFILE_RESULT_LOCK:
+                    _PROFILE_RESULT_CACHE[usuario_id] = result
+            return result
             
         except Exception as e:
             error_msg = f"Database error: {str(e)}"
             return self._create_error_response(error_msg)
-            
-        finally:
-            # Garantir fechamento da sessão
-            if db_session:
-                try:
-                    db_session.close()
-                except Exception:
-                    pass  # Ignorar erros de fechamento
 
-    def _get_latest_profile(self, db_session, usuario_id: int):
+    def invalidate(self, usuario_id: int) -> None:
+        """Descarta os dados em cache de um usuário (chamar após alterar o perfil dele)."""
+        self._profile_cache.pop(usuario_id, None)
+        invalidate_profile_cache(usuario_id)
+
+    def get_latest_profiles(self, usuario_ids: List[int]) -> Dict[int, Any]:
+        """
+        Busca o perfil financeiro mais recente de vários usuários em uma única consulta.
+
+        Os perfis ficam em cache para as próximas chamadas de _run, evitando N+1
+        quando uma crew avalia vários usuários.
+        """
+        if not SessionLocal or not FinancialProfile:
+            return {}
+
+        pending = [i for i in set(usuario_ids) if i not in self._profile_cache]
+        if pending:
+            try:
+                with ScopedSession() as db_session:
+                    self._profile_cache.update(self._query_latest_profiles(db_session, pending))
+            except Exception as e:
+                print(f"Error querying profiles for users {pending}: {e}")
+
+        return {i: self._profile_cache.get(i) for i in usuario_ids}
+
+    def _get_latest_profile(self, usuario_id: int):
         """Busca o perfil financeiro mais recente de um usuário."""
         try:
-            return (
-                db_session.query(FinancialProfile)
-                .filter(FinancialProfile.usuario_id == usuario_id)
-                .order_by(FinancialProfile.data_criado.desc())
-                .first()
-            )
+            with ScopedSession() as db_session:
+                return self._query_latest_profiles(db_session, [usuario_id]).get(usuario_id)
         except Exception as e:
             print(f"Error querying profile for user {usuario_id}: {e}")
             return None
 
+    @staticmethod
+    def _query_latest_profiles(db_session, usuario_ids: List[int]) -> Dict[int, Any]:
+        """SELECT único com ROW_NUMBER() OVER (PARTITION BY usuario_id ORDER BY data_criado DESC)."""
+        ranked = (
+            db_session.query(
+                FinancialProfile.id.label("id"),
+                func.row_number().over(
+                    partition_by=FinancialProfile.usuario_id,
+                    order_by=FinancialProfile.data_criado.desc(),
+                ).label("rn"),
+            )
+            .filter(FinancialProfile.usuario_id.in_(usuario_ids))
+            .subquery()
+        )
+        profiles = (
+            db_session.query(FinancialProfile)
+            .options(undefer(FinancialProfile.questionnaire_data), undefer(FinancialProfile.objetivo))
+            .join(ranked, FinancialProfile.id == ranked.c.id)
+            .filter(ranked.c.rn == 1)
+            .all()
+        )
+        return {p.usuario_id: p for p in profiles}
+
     def _process_profile_data(self, profile) -> dict:
         """Processa e estrutura os dados do perfil financeiro."""
 
@@ -254,17 +731,14 @@ class DatabaseFinancialProfileTool(BaseTool):
             return {}
             
         try:
-            # Remove null bytes se presentes
-            clean_string = json_string.replace('\x00', '')
-            
-            # Remove espaços em branco extras
-            clean_string = clean_string.strip()
+            # Remove null bytes (translate) e espaços das pontas
+            clean_string = json_string.translate(_NULL_TRANS).strip()
             
             if not clean_string:
                 return {}
                 
             # Parse do JSON
-            parsed_data = json.loads(clean_string)
+            parsed_data = _loads(clean_string)
             
             # Validação básica
             if not isinstance(parsed_data, dict):
@@ -295,7 +769,20 @@ class DatabaseFinancialProfileTool(BaseTool):
             "error": error_message,
             "timestamp": _now_iso()
         }
-        return json.dumps(error_response, ensure_ascii=False)
+        return _dumps(error_response)
+
+
+def invalidate_profile_cache(usuario_id: Optional[int] = None) -> None:
+    """Descarta o perfil em cache de um usuário (ou de todos, sem usuario_id) após gravá-lo.
+
+    O cache expira sozinho em 60s, então outros processos ficam no máximo esse tempo defasados.
+    """
+    if _PROFILE_RESULT_CACHE is not None:
+        with _PROFILE_RESULT_LOCK:
+            if usuario_id is None:
+                _PROFILE_RESULT_CACHE.clear()
+            else:
+                _PROFILE_RESULT_CACHE.pop(usuario_id, None)
 
 # ----------------------------------------------------------------------------
 # 1) BankStatementParserTool (CSV)
@@ -317,28 +804,110 @@ CATEGORY_MAP = {
     "invest|tesouro|cdb|fundo|bolsa|corretora|clear|xp|rico": "Investimentos",
 }
 
+# Padrões compilados uma única vez, na ordem de prioridade do CATEGORY_MAP
+CATEGORY_PATTERNS = [(cat, re.compile(pattern, re.IGNORECASE)) for pattern, cat in CATEGORY_MAP.items()]
+
+# Uma única regex para o caminho escalar: um lookahead nomeado por padrão, ancorado
+# no início e testado na ordem do CATEGORY_MAP (mantém a prioridade, não a posição)
+CATEGORY_GROUPS = {f"c{i}": cat for i, cat in enumerate(CATEGORY_MAP.values())}
+CATEGORY_RX = re.compile(
+    r"\A(?:" + "|".join(f"(?=.*?(?P<c{i}>{pattern}))" for i, pattern in enumerate(CATEGORY_MAP)) + ")",
+    re.IGNORECASE | re.DOTALL,
+)
+
+@lru_cache(maxsize=8192)
+def _categorize_cached(descricao: str) -> str:
+    """Categoriza uma descrição via regex; descrições repetidas viram lookup O(1)."""
+    m = CATEGORY_RX.match((descricao or "").lower())
+    return CATEGORY_GROUPS[m.lastgroup] if m else "Outros"
+
+def _build_category_automaton():
+    """Autômato Aho-Corasick com as palavras-chave do CATEGORY_MAP (todas literais).
+
+    Cada palavra guarda o índice de prioridade do seu padrão; a categoria de uma
+    descrição é a do menor índice encontrado, como na ordem do CATEGORY_MAP.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for prioridade, pattern in enumerate(CATEGORY_MAP):
+        for palavra in pattern.split("|"):
+            if palavra not in automaton:
+                automaton.add_word(palavra, prioridade)
+    automaton.make_automaton()
+    return automaton
+
+CATEGORY_AUTOMATON = _build_category_automaton()
+CATEGORY_BY_PRIORITY = list(CATEGORY_MAP.values())
+
+# Separadores aceitos nos CSVs de extrato, em ordem de preferência no empate
+CSV_DELIMITERS = (",", ";", "\t", "|")
+
 DEFAULT_COLUMNS_CANDIDATES = {
     "date": ["data", "date", "dt", "data_lancamento"],
     "desc": ["descricao", "descrição", "description", "historico", "detalhe", "title"],
     "amount": ["valor", "amount", "vl", "montante"],
 }
 
+# Coluna interna (datetime64) usada só para ordenar as transações por data
+DATE_SORT_COLUMN = "_data_ordem"
+
 # ======== CACHE E CONFIGURAÇÕES PARA CATEGORIZAÇÃO AVANÇADA ========
-CACHE_PATH = "categorias_cache.pkl"
-BLOCO_TAMANHO = 10
+CACHE_PATH = "categorias_cache_v2.pkl"
+# Cache anterior (chave = nome limpo com números); migrado para CACHE_PATH na primeira carga
+LEGACY_CACHE_PATH = "categorias_cache.pkl"
+REFINE_CACHE_PATH = "refine_cache.pkl"
+BLOCO_TAMANHO = 50
+# Blocos de categorização enviados simultaneamente ao Ollama (ver OLLAMA_NUM_PARALLEL no servidor)
+CATEGORIZATION_WORKERS = int(os.getenv("CATEGORIZATION_WORKERS", "4"))
+
+# Saída estruturada do Ollama (`format`): o modelo devolve diretamente um array JSON
+CATEGORIZATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"t": {"type": "string"}, "c": {"type": "string"}},
+        "required": ["t", "c"],
+    },
+}
+
+# Serializa leitura+gravação dos caches em disco entre as threads (run_many)
+_CACHE_FILE_LOCK = threading.Lock()
 
 def load_cache(path: str) -> dict:
     """Carrega cache de categorias do disco."""
     if os.path.exists(path):
-        with open(path, 'rb') as f:
-            return pickle.load(f)
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (EOFError, pickle.UnpicklingError):
+            return {}
     return {}
 
 def save_cache(cache: dict, path: str) -> None:
-    """Salva cache de categorias no disco."""
-    with open(path, 'wb') as f:
-        pickle.dump(cache, f)
+    """
+    Salva cache de categorias no disco.
+
+    Mescla com o conteúdo atual do arquivo (entradas gravadas por execuções
+    concorrentes não se perdem) e grava em arquivo temporário + os.replace,
+    de modo que leitores nunca vejam um pickle pela metade.
+    """
+    with _CACHE_FILE_LOCK:
+        merged = {**load_cache(path), **cache}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(merged, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+    cache.update(merged)
 
+@lru_cache(maxsize=65536)
 def clean_transaction_name(transaction_name: str) -> str:
     """Limpa o nome da transação para cache e comparação."""
     if not transaction_name:
@@ -346,6 +915,36 @@ def clean_transaction_name(transaction_name: str) -> str:
     parts = transaction_name.split(' - ')
     return ' - '.join(parts[:2]) if len(parts) > 2 else transaction_name
 
+_RE_DIGITS = re.compile(r"\d+")
+
+@lru_cache(maxsize=65536)
+def categorization_cache_key(transaction_name: str) -> str:
+    """Chave do cache de categorias: nome limpo, sem números e em maiúsculas, para que
+    repetições do mesmo estabelecimento ("UBER TRIP 123", "UBER TRIP 456") reaproveitem
+    a mesma categoria. Nomes só com números mantêm o nome limpo como chave."""
+    t_clean = clean_transaction_name(transaction_name)
+    return " ".join(_RE_DIGITS.sub("", t_clean).split()).upper() or t_clean
+
+def load_categorization_cache(path: str) -> dict:
+    """
+    Carrega o cache de categorias. Na primeira execução (sem CACHE_PATH), reaproveita
+    as entradas de LEGACY_CACHE_PATH convertendo as chaves com categorization_cache_key
+    (em colisões, uma categoria diferente de "Outros" prevalece).
+    """
+    if os.path.exists(path):
+        return load_cache(path)
+    legacy = load_cache(os.path.join(os.path.dirname(path), LEGACY_CACHE_PATH))
+    if not legacy:
+        return {}
+    cache = {}
+    for name, cat in legacy.items():
+        key = categorization_cache_key(str(name))
+        if key not in cache or cache[key] == "Outros":
+            cache[key] = cat
+    save_cache(cache, path)
+    print(f"[INFO] Cache de categorias migrado de {LEGACY_CACHE_PATH}: {len(legacy)} -> {len(cache)} entradas")
+    return cache
+
 def generate_categorization_prompt(transactions: list) -> str:
     """Gera prompt para categorização em lote com LLM."""
     formatted = '\n'.join(f"{clean_transaction_name(t)}" for t in transactions)
@@ -367,110 +966,84 @@ CATEGORIAS DISPONÍVEIS:
 - Outros (quando nenhuma outra categoria se aplicar)
 
 FORMATO DE RESPOSTA:
-Para cada transação, responda EXATAMENTE no formato:
-[NOME DA TRANSAÇÃO] - [CATEGORIA]
+Responda APENAS com um array JSON, com um objeto por transação, no formato:
+[{{"t": "NOME DA TRANSAÇÃO", "c": "CATEGORIA"}}]
 
 TRANSAÇÕES PARA CATEGORIZAR:
 {formatted}
 
-EXEMPLOS:
-UBER TRIP 12345 - Transporte
-NETFLIX.COM - Streaming  
-SUPERMERCADO EXTRA - Mercado
-PIX TRANSFERIDO - Transferências
+EXEMPLO:
+[{{"t": "UBER TRIP 12345", "c": "Transporte"}}, {{"t": "NETFLIX.COM", "c": "Streaming"}}, {{"t": "PIX TRANSFERIDO", "c": "Transferências"}}]
 
 RESPOSTA:"""
     return prompt.strip()
 
 def parse_llm_categorization_response(response: str, original_transactions: list) -> list:
-    """Faz parse da resposta do LLM para extrair categorizações."""
+    """Faz parse da resposta JSON estruturada do LLM ([{"t": ..., "c": ...}])."""
     if not response or not original_transactions:
         return []
-        
-    lines = [line.strip() for line in response.split('\n') if line.strip()]
-    parsed = []
-    
-    # Cria mapeamentos para busca mais eficiente
+
+    try:
+        data = _loads(response)
+    except json.JSONDecodeError as e:
+        print(f"[DEBUG] Resposta do LLM não é JSON válido: {e}")
+        return []
+
+    # Alguns modelos embrulham o array em um objeto (ex: {"transacoes": [...]})
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), [])
+
+    # Cria mapeamentos para busca em O(1)
     trans_originais = {clean_transaction_name(t): t for t in original_transactions}
-    trans_originais_lower = {k.lower(): v for k, v in trans_originais.items()}
-    
-    print(f"[DEBUG] Parsing LLM response. Lines: {len(lines)}")
-    print(f"[DEBUG] Original transactions: {len(original_transactions)}")
-    
-    for line_idx, line in enumerate(lines):
-        line_original = line
-        
-        # Remove numeração inicial se houver (ex: "1. ")
-        line = re.sub(r'^\d+\.\s*', '', line)
-        
-        # Tenta diferentes separadores
-        separators = [' - ', ':', ' -> ', ' | ', '\t']
-        found_match = False
-        
-        for sep in separators:
-            if sep in line:
-                parts = line.split(sep)
-                if len(parts) >= 2:
-                    trans_part = parts[0].strip()
-                    cat_part = parts[-1].strip()  # Pega a última parte como categoria
-                    
-                    # Remove pontuação extra da categoria
-                    cat_clean = re.sub(r'[^\w\s]', '', cat_part).strip()
-                    
-                    # Busca exata primeiro
-                    if trans_part in trans_originais:
-                        parsed.append((trans_part, cat_clean))
-                        found_match = True
-                        print(f"[DEBUG] Exact match: '{trans_part}' -> '{cat_clean}'")
-                        break
-                    
-                    # Busca case-insensitive
-                    elif trans_part.lower() in trans_originais_lower:
-                        original_key = trans_originais_lower[trans_part.lower()]
-                        parsed.append((original_key, cat_clean))
-                        found_match = True
-                        print(f"[DEBUG] Case-insensitive match: '{trans_part}' -> '{cat_clean}'")
-                        break
-                    
-                    # Busca por correspondência parcial
-                    else:
-                        for orig_clean in trans_originais.keys():
-                            # Similaridade bidirecional mais flexível
-                            if (trans_part.lower() in orig_clean.lower() or 
-                                orig_clean.lower() in trans_part.lower() or
-                                _calculate_similarity(trans_part.lower(), orig_clean.lower()) > 0.8):
-                                parsed.append((orig_clean, cat_clean))
-                                found_match = True
-                                print(f"[DEBUG] Partial match: '{trans_part}' matched '{orig_clean}' -> '{cat_clean}'")
-                                break
-                        if found_match:
-                            break
-        
-        if not found_match:
-            print(f"[DEBUG] No match found for line {line_idx + 1}: '{line_original}'")
-    
-    print(f"[DEBUG] Successfully parsed {len(parsed)} transactions")
+    trans_originais_lower = {k.lower(): k for k in trans_originais}
+    keys = list(trans_originais.keys())
+
+    parsed = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        trans_part = str(item.get("t", "")).strip()
+        cat_clean = re.sub(r'[^\w\s]', '', str(item.get("c", ""))).strip()
+        if not trans_part or not cat_clean:
+            continue
+
+        # Busca exata primeiro, depois case-insensitive
+        if trans_part in trans_originais:
+            parsed.append((trans_part, cat_clean))
+        elif trans_part.lower() in trans_originais_lower:
+            parsed.append((trans_originais_lower[trans_part.lower()], cat_clean))
+        else:
+            # Casamento aproximado para nomes reescritos pelo modelo
+            match = None
+            if fuzz_process is not None:
+                match = fuzz_process.extractOne(trans_part, keys, scorer=fuzz.WRatio, score_cutoff=80)
+            if match:
+                parsed.append((match[0], cat_clean))
+            else:
+                print(f"[DEBUG] No match found for: '{trans_part}'")
+
+    print(f"[DEBUG] Successfully parsed {len(parsed)} of {len(original_transactions)} transactions")
     return parsed
 
-def _calculate_similarity(str1: str, str2: str) -> float:
-    """Calcula similaridade simples entre duas strings."""
-    if not str1 or not str2:
-        return 0.0
-    
-    # Conta caracteres em comum
-    set1 = set(str1.lower())
-    set2 = set(str2.lower())
-    intersection = len(set1 & set2)
-    union = len(set1 | set2)
-    
-    return intersection / union if union > 0 else 0.0
+def _transaction_records(transacoes: Any, limit: Optional[int] = None) -> list:
+    """Lista de transações (dicts) a partir do formato "records" ou "split" ({columns, data})."""
+    if isinstance(transacoes, dict):
+        cols = transacoes.get("columns") or []
+        rows = transacoes.get("data") or []
+        if limit is not None:
+            rows = rows[:limit]
+        return [dict(zip(cols, row)) for row in rows]
+    if not isinstance(transacoes, list):
+        return []
+    return transacoes[:limit] if limit is not None else transacoes
 
 class BankStatementParserToolSchema(BaseModel):
     file_path: str = Field(description="Path to the uploaded bank statement (csv)")
     llm_enhanced: bool = Field(default=False, description="If True, uses LLM to refine categorization when available")
     categorization_method: str = Field(default="regex", description="Método de categorização: 'regex' (padrão) ou 'ollama' (avançado com cache)")
     ollama_model: str = Field(default="gemma3", description="Modelo Ollama para categorização avançada")
-    block_size: int = Field(default=10, description="Tamanho do bloco para processamento em lote no modo Ollama")
+    block_size: int = Field(default=BLOCO_TAMANHO, description="Tamanho do bloco para processamento em lote no modo Ollama")
+    output_format: str = Field(default="records", description="Formato de 'transacoes': 'records' (lista de objetos) ou 'split' ({columns, data}, mais compacto)")
 
 class BankStatementParserTool(BaseTool):
     name: str = "BankStatementParserTool"
@@ -480,21 +1053,25 @@ class BankStatementParserTool(BaseTool):
     args_schema = BankStatementParserToolSchema
 
     def _run(self, file_path: str, llm_enhanced: bool = False, categorization_method: str = "regex", 
-             ollama_model: str = "gemma3", block_size: int = 10) -> str:
+             ollama_model: str = "gemma3", block_size: int = BLOCO_TAMANHO,
+             output_format: str = "records") -> str:
         try:
             print(f"🔍 DEBUG - Iniciando processamento do arquivo: {file_path}")
             print(f"🔍 DEBUG - BankStatementParserTool usando modelo: {ollama_model}")
+            if categorization_method == "ollama" or llm_enhanced:
+                # Carrega o modelo enquanto o CSV é lido e normalizado
+                get_llm_client().warm_up(ollama_model)
             print(f"🔍 DEBUG - Parâmetros: llm_enhanced={llm_enhanced}, method={categorization_method}")
             
             ext = pathlib.Path(file_path).suffix.lower()
             if ext == ".csv":
                 df = self._read_csv(file_path)
             else:
-                return json.dumps({"ok": False, "error": f"Unsupported extension: {ext}"})
+                return _dumps({"ok": False, "error": f"Unsupported extension: {ext}"})
 
             if df is None or df.empty:
                 print(f"❌ DEBUG - DataFrame vazio ou None")
-                return json.dumps({"ok": False, "error": "Empty or unreadable statement"})
+                return _dumps({"ok": False, "error": "Empty or unreadable statement"})
 
             print(f"🔍 DEBUG - DataFrame carregado com {len(df)} linhas")
             df = self._normalize_columns(df)
@@ -506,117 +1083,150 @@ class BankStatementParserTool(BaseTool):
                 already_categorized = False
             
             # NOVO: Limpar descrições antes de categorizar
-            df["descricao_original"] = df["descricao"]  # Backup da descrição original
-            df["descricao"] = df["descricao"].apply(self._clean_description)
+            # Mantém apenas as duas primeiras partes separadas por " - ", ex:
+            # "Transferência enviada pelo Pix - COMPANHIA PIRATININGA - 04.172.213/0001-51"
+            # → "Transferência enviada pelo Pix - COMPANHIA PIRATININGA"
+            df["descricao_original"] = df["descricao"].copy()  # Backup da descrição original
+            desc_list = df["descricao"].fillna("").astype(str).str.strip().tolist()
+            df["descricao"] = [
+                " - ".join(d.split(" - ", 2)[:2]).strip() if d.count(" - ") >= 2 else d
+                for d in desc_list
+            ]
             
-            # NOVO: Filtrar apenas despesas para categorização (valores negativos)
-            df_expenses = df[df["valor"] < 0].copy()
-            df_non_expenses = df[df["valor"] >= 0].copy()
+            # NOVO: Apenas despesas (valores negativos) são categorizadas; máscara em vez de cópias
+            mask = df["valor"].to_numpy() < 0
+            n_despesas = int(mask.sum())
+            n_receitas = int((~mask).sum())
             
             if already_categorized == False:
                 print(f"🔍 DEBUG - Iniciando categorização com método: {categorization_method}")
-                print(f"🔍 DEBUG - Despesas para categorizar: {len(df_expenses)}")
+                print(f"🔍 DEBUG - Despesas para categorizar: {n_despesas}")
                 
                 # Categorizar apenas despesas
                 if categorization_method == "ollama":
                     print(f"🔍 DEBUG - Usando categorização Ollama com modelo: {ollama_model}")
-                    df_expenses = self._categorize_with_ollama(df_expenses, ollama_model, block_size)
+                    categorias = self._categorize_with_ollama(df.loc[mask], ollama_model, block_size)["categoria"]
                     print(f"🔍 DEBUG - Categorização Ollama concluída")
                 else:
                     print(f"🔍 DEBUG - Usando categorização regex")
-                    df_expenses["categoria"] = df_expenses["descricao"].apply(self._categorize)
+                    # Descrições em minúsculas calculadas uma vez: regex e refinamento usam a mesma
+                    desc_lower = df.loc[mask, "descricao"].fillna("").astype("string").str.lower()
+                    categorias = self._categorize_series(desc_lower, lowered=True)
                     
                     if llm_enhanced:
                         try:
-                            df_expenses = self._refine_categories_with_llm(df_expenses, model=ollama_model)
+                            df_expenses = df.loc[mask].assign(categoria=categorias)
+                            categorias = self._refine_categories_with_llm(
+                                df_expenses, model=ollama_model, desc_lower=desc_lower
+                            )["categoria"]
                         except Exception:
                             pass
             
                 # Categorizar não-despesas como "Renda" (receitas/transferências recebidas)
-                df_non_expenses["categoria"] = "Renda"
-                print(f"🔍 DEBUG - Receitas categorizadas como 'Renda': {len(df_non_expenses)}")
+                df["categoria"] = "Renda"
+                df.loc[mask, "categoria"] = categorias
+                print(f"🔍 DEBUG - Receitas categorizadas como 'Renda': {n_receitas}")
             else:
                 print(f"🔍 DEBUG - Transações já categorizadas, pulando categorização")
             
-            # Recombinar DataFrames (sempre executar)
-            df_categorized = pd.concat([df_expenses, df_non_expenses], ignore_index=True)
-            df_categorized = df_categorized.sort_values("data").reset_index(drop=True)
-            
-            # Remover coluna "descricao_original" se existir antes de gerar output
-            if "descricao_original" in df_categorized.columns:
-                df_categorized = df_categorized.drop(columns=["descricao_original"])
+            # Ordenar uma única vez, no próprio DataFrame, pela data já interpretada
+            # ("data" segue com o texto original do extrato)
+            df.sort_values(DATE_SORT_COLUMN, inplace=True, kind="mergesort", ignore_index=True)
             
-            # NOVO: Remover coluna "Identificador" se existir
-            if "identificador" in df_categorized.columns:
-                df_categorized = df_categorized.drop(columns=["identificador"])
-            if "Identificador" in df_categorized.columns:
-                df_categorized = df_categorized.drop(columns=["Identificador"])
-            
-            # Rollups apenas para despesas (categoria != "Renda")
-            df_for_totals = df_categorized[df_categorized["categoria"] != "Renda"]
-            totals = (
-                df_for_totals.groupby("categoria")["valor"]
-                .sum()
-                .reset_index()
-                .sort_values("valor")
+            # Remover a chave de ordenação, "descricao_original" e "Identificador" antes de gerar output
+            df.drop(
+                columns=[c for c in (DATE_SORT_COLUMN, "descricao_original", "identificador", "Identificador")
+                         if c in df.columns],
+                inplace=True
             )
+            df_categorized = df
+            
+            # Rollups apenas para despesas (categoria != "Renda"): códigos inteiros por
+            # categoria (factorize) somados numa única passada com np.bincount
+            # (máscara bool explícita: categoria nula não é "Renda", mesmo em colunas nullable)
+            is_renda = df_categorized["categoria"].eq("Renda").fillna(False).to_numpy(dtype=bool)
+            valores = df_categorized["valor"].to_numpy(dtype="float64")
+            codes, uniques = pd.factorize(df_categorized["categoria"].astype(object).to_numpy()[~is_renda], sort=True)
+            validos = codes >= 0  # categoria nula fica fora, como no groupby
+            somas = np.bincount(codes[validos], weights=valores[~is_renda][validos], minlength=len(uniques))
+            # A soma sequencial do bincount acumula ruído de ponto flutuante: valores de
+            # extrato são em centavos, então os totais voltam arredondados a centavos
+            somas = np.round(somas, 2)
+            # Ordena por valor; empates ficam em ordem alfabética
+            totals = [
+                {"categoria": cat, "valor": valor}
+                for cat, valor in sorted(zip(uniques.tolist(), somas.tolist()), key=lambda r: r[1])
+            ]
             
             # Adicionar total de receitas separadamente
-            total_renda = df_categorized[df_categorized["categoria"] == "Renda"]["valor"].sum()
+            total_renda = round(float(valores[is_renda].sum()), 2)
             if total_renda > 0:
-                totals = pd.concat([
-                    totals,
-                    pd.DataFrame([{"categoria": "Renda", "valor": total_renda}])
-                ], ignore_index=True)
+                totals.append({"categoria": "Renda", "valor": total_renda})
         
             summary = {
                 "ok": True,
                 "timestamp": _now_iso(),
                 "method": categorization_method,
                 "n_transacoes": int(len(df_categorized)),
-                "n_despesas": int(len(df_expenses)),
-                "n_receitas": int(len(df_non_expenses)),
-                "totais_por_categoria": totals.to_dict(orient="records") if pd is not None else [],
-                "transacoes": df_categorized.to_dict(orient="records") if pd is not None else [],
+                "n_despesas": n_despesas,
+                "n_receitas": n_receitas,
+                "totais_por_categoria": totals,
+                "transacoes": (
+                    self._split(df_categorized) if output_format == "split" else self._records(df_categorized)
+                ),
             }
-            return json.dumps(summary, ensure_ascii=False)
+            return _dumps(summary)
         except Exception as e:
-            import traceback
-            return json.dumps({
+            return _dumps({
                 "ok": False, 
                 "error": str(e),
                 "traceback": traceback.format_exc()
             })
 
-    def _clean_description(self, descricao: str) -> str:
-        """
-        Limpa descrição removendo conteúdo após segundo hífen.
-        
-        Exemplo:
-        "Transferência enviada pelo Pix - COMPANHIA PIRATININGA - 04.172.213/0001-51"
-        → "Transferência enviada pelo Pix - COMPANHIA PIRATININGA"
-        """
-        if not descricao or pd.isna(descricao):
-            return ""
-        
-        descricao_str = str(descricao).strip()
-        
-        # Contar hífens
-        hyphen_count = descricao_str.count(' - ')
-        
-        if hyphen_count >= 2:
-            # Encontrar posição do segundo hífen
-            parts = descricao_str.split(' - ')
-            # Manter apenas as duas primeiras partes
-            cleaned = ' - '.join(parts[:2])
-            return cleaned.strip()
-        
-        return descricao_str
+    def _records(self, df) -> list:
+        """Equivalente a to_dict(orient="records"), montado a partir das colunas (tolist por coluna)."""
+        cols = list(df.columns)
+        arrs = [df[c].tolist() for c in cols]
+        return [dict(zip(cols, row)) for row in zip(*arrs)]
+
+    def _split(self, df) -> dict:
+        """Formato colunar ("split" sem índice): nomes das colunas uma vez e linhas como listas."""
+        cols = list(df.columns)
+        return {"columns": cols, "data": [list(row) for row in zip(*(df[c].tolist() for c in cols))]}
 
     def _read_csv(self, path: str):
         if pd is None:
             raise JSONableError("pandas is required for CSV parsing")
-        return pd.read_csv(path)
+        delimiter = self._sniff_delimiter(path)
+        if pa_csv is not None:
+            try:
+                table = pa_csv.read_csv(
+                    path,
+                    read_options=pa_csv.ReadOptions(use_threads=True),
+                    parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+                    convert_options=pa_csv.ConvertOptions(strings_can_be_null=True),
+                )
+                # Datas inferidas pelo Arrow voltam a texto, como no pandas.read_csv
+                table = table.cast(pa.schema([
+                    pa.field(f.name, pa.string()) if pa.types.is_temporal(f.type) else f
+                    for f in table.schema
+                ]))
+                # dtypes numpy do pandas (sem ArrowDtype): nulos saem como NaN/null no JSON
+                return table.to_pandas()
+            except Exception as e:
+                print(f"[WARNING] pyarrow não conseguiu ler o CSV ({e}) — usando pandas.read_csv")
+        return pd.read_csv(path, sep=delimiter)
+
+    def _sniff_delimiter(self, path: str) -> str:
+        """Separador do CSV pelo cabeçalho: extratos de bancos brasileiros costumam usar ';'."""
+        try:
+            with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+                header = next((line for line in islice(f, 20) if line.strip()), "")
+        except OSError:
+            return ","
+        counts = {d: header.count(d) for d in CSV_DELIMITERS}
+        best = max(counts, key=counts.get)
+        return best if counts[best] > 0 else ","
 
     def _normalize_columns(self, df):
         """Normaliza nomes de colunas e valores monetários."""
@@ -643,43 +1253,25 @@ class BankStatementParserTool(BaseTool):
         print(f"🔍 DEBUG - Primeira linha: {out.iloc[0].to_dict() if len(out) > 0 else 'VAZIO'}")
         
         # Normalização de valores monetários
-        def normalize_monetary_value(val):
-            if pd.isna(val) or val == '':
-                return 0.0
-            
-            str_val = str(val).strip()
-            
-            try:
-                return float(str_val)
-            except:
-                pass
-            
-            # Remove símbolos de moeda
-            str_val = re.sub(r'[R$\s]+', '', str_val)
-            
-            dot_count = str_val.count('.')
-            comma_count = str_val.count(',')
-            
-            # Formato brasileiro: 1.234.567,89
-            if comma_count == 1 and dot_count >= 1:
-                str_val = str_val.replace('.', '').replace(',', '.')
-            # Formato brasileiro simples: 123,45
-            elif comma_count == 1 and dot_count == 0:
-                str_val = str_val.replace(',', '.')
-            # Separadores de milhares com vírgulas
-            elif comma_count >= 1 and dot_count == 0:
-                if comma_count > 1 or len(str_val.replace(',', '')) > 3:
-                    str_val = str_val.replace(',', '')
-                else:
-                    str_val = str_val.replace(',', '.')
-            
-            try:
-                return float(str_val)
-            except:
-                print(f"[WARNING] Não foi possível converter valor: '{val}' -> assumindo 0.0")
-                return 0.0
-        
-        out["valor"] = out["valor"].apply(normalize_monetary_value)
+        out["valor"] = self._normalize_amounts(out["valor"])
+        
+        # Datas: "data" mantém o texto original; a chave de ordenação (datetime64) fica em
+        # DATE_SORT_COLUMN. dd/mm/aaaa é lido com dia primeiro; o resto como ISO 8601
+        texto = out["data"].astype("string").str.strip()
+        dia_primeiro = texto.str.fullmatch(r"\d{2}/\d{2}/\d{4}").fillna(False).astype(bool)
+        datas = pd.Series(pd.NaT, index=out.index, dtype="datetime64[ns]")
+        if dia_primeiro.any():
+            datas[dia_primeiro] = pd.to_datetime(
+                texto[dia_primeiro], format="%d/%m/%Y", errors="coerce", cache=True
+            )
+        outras = ~dia_primeiro & texto.notna()
+        if outras.any():
+            datas[outras] = pd.to_datetime(
+                texto[outras], format="ISO8601", errors="coerce", cache=True
+            )
+        if (datas.isna() & texto.notna()).any():
+            print("[WARNING] Algumas datas não puderam ser interpretadas — ficam no fim da ordenação")
+        out[DATE_SORT_COLUMN] = datas
         
         # Remover coluna Identificador se existir
         for id_col in ["identificador", "Identificador", "id", "ID"]:
@@ -688,15 +1280,74 @@ class BankStatementParserTool(BaseTool):
         
         return out
 
+    def _normalize_amounts(self, valores):
+        """Converte a coluna de valores para float de forma vetorizada.
+
+        Coluna já numérica passa direto; texto vai por pd.to_numeric e só o que falhar
+        recebe a limpeza de moeda e separadores (1.234,56 / 123,45 / 1,234,567).
+        Vazios viram 0.0; o que continuar inválido também, com aviso.
+        """
+        if pd.api.types.is_numeric_dtype(valores):
+            return valores.astype("float64").fillna(0.0)
+
+        texto = valores.astype("string").str.strip()
+        vazio = texto.isna() | (texto == "")
+        numeros = pd.to_numeric(texto, errors="coerce").astype("float64")
+
+        pendentes = numeros.isna() & ~vazio
+        if pendentes.any():
+            # Remove símbolos de moeda e espaços
+            limpo = texto[pendentes].str.replace(r"[R$\s]+", "", regex=True)
+            pontos = limpo.str.count(r"\.")
+            virgulas = limpo.str.count(",")
+            sem_pontos = limpo.str.replace(".", "", regex=False)
+            limpo = limpo.mask(
+                # Formato brasileiro: 1.234.567,89
+                (virgulas == 1) & (pontos >= 1), sem_pontos.str.replace(",", ".", regex=False)
+            ).mask(
+                # Formato brasileiro simples: 123,45
+                (virgulas == 1) & (pontos == 0), limpo.str.replace(",", ".", regex=False)
+            ).mask(
+                # Separadores de milhares com vírgulas
+                (virgulas > 1) & (pontos == 0), limpo.str.replace(",", "", regex=False)
+            )
+            numeros[pendentes] = pd.to_numeric(limpo, errors="coerce").astype("float64")
+
+            invalidos = numeros.isna() & ~vazio
+            for val in valores[invalidos].tolist():
+                print(f"[WARNING] Não foi possível converter valor: '{val}' -> assumindo 0.0")
+
+        return numeros.fillna(0.0)
+
     def _categorize(self, descricao: str) -> str:
         """Categoriza usando regex - apenas para despesas."""
-        text = (descricao or "").lower()
-        for pattern, cat in CATEGORY_MAP.items():
-            if re.search(pattern, text):
-                return cat
-        return "Outros"
+        return _categorize_cached(descricao)
 
-    def _categorize_with_ollama(self, df, ollama_model: str = "gemma3", block_size: int = 10):
+    def _categorize_series(self, descricoes, lowered: bool = False):
+        """
+        Categoriza uma Series com uma varredura vetorizada (str.contains) por padrão.
+
+        As varreduras rodam sobre as descrições únicas; np.select escolhe o primeiro
+        padrão que casa, respeitando a ordem de prioridade do CATEGORY_MAP. Com
+        pyahocorasick instalado, uma única passada do autômato substitui as varreduras.
+        lowered=True indica que as descrições já vêm em minúsculas, sem nulos.
+        """
+        keys = descricoes if lowered else descricoes.fillna("").astype("string").str.lower()
+        uniq = pd.Series(keys.unique(), dtype=object)
+        if CATEGORY_AUTOMATON is not None:
+            # Uma passada do autômato por descrição única, em vez de uma varredura por padrão
+            n = len(CATEGORY_BY_PRIORITY)
+            mapa = {}
+            for desc in uniq.tolist():
+                prioridade = min((p for _, p in CATEGORY_AUTOMATON.iter(desc)), default=n)
+                mapa[desc] = CATEGORY_BY_PRIORITY[prioridade] if prioridade < n else "Outros"
+            return keys.map(mapa)
+        conds = [uniq.str.contains(pattern, regex=True, na=False).to_numpy() for _, pattern in CATEGORY_PATTERNS]
+        choices = [cat for cat, _ in CATEGORY_PATTERNS]
+        cats = np.select(conds, choices, default="Outros")
+        return keys.map(dict(zip(uniq.tolist(), cats.tolist())))
+
+    def _categorize_with_ollama(self, df, ollama_model: str = "gemma3", block_size: int = BLOCO_TAMANHO):
         """Categoriza transações usando Ollama - apenas despesas."""
         print(f"[INFO] Iniciando categorização com Ollama (modelo: {ollama_model})")
 
@@ -706,7 +1357,7 @@ class BankStatementParserTool(BaseTool):
             return self._categorize_with_regex_fallback(df)
 
         try:
-            llm = ChatOllama(model=ollama_model, temperature=0.2)
+            llm = ChatOllama(model=ollama_model, temperature=0.2, format=CATEGORIZATION_SCHEMA)
             print(f"[INFO] Modelo Ollama '{ollama_model}' inicializado com sucesso")
         except Exception as e:
             print(f"[ERROR] Falha ao inicializar Ollama: {e}")
@@ -716,113 +1367,128 @@ class BankStatementParserTool(BaseTool):
         if pd is None:
             raise JSONableError("pandas is required for Ollama categorization")
         
-        df_copy = df.copy()
-        transacoes = df_copy["descricao"].fillna("").astype(str).tolist()
+        transacoes = df["descricao"].fillna("").astype(str).tolist()
         
         print(f"[INFO] Total de transações (despesas): {len(transacoes)}")
         
         # Carrega cache
         cache_path = os.path.join(os.path.dirname(__file__), "..", CACHE_PATH)
-        cache = load_cache(cache_path)
+        cache = load_categorization_cache(cache_path)
         print(f"[INFO] Cache carregado com {len(cache)} entradas")
         
         # Identifica transações que precisam categorização
-        transacoes_para_categorizar = []
         transacoes_no_cache = 0
         
-        for t in transacoes:
-            t_clean = clean_transaction_name(t)
-            if t_clean and t_clean not in cache:
-                transacoes_para_categorizar.append(t)
-            elif t_clean in cache:
+        # Chave de cache calculada uma vez por transação e reutilizada abaixo
+        limpos = list(map(categorization_cache_key, transacoes))
+        
+        # Apenas estabelecimentos únicos fora do cache vão para os blocos do LLM
+        pendentes = {}
+        for t, t_clean in zip(transacoes, limpos):
+            if t_clean in cache:
                 transacoes_no_cache += 1
+            elif t_clean:
+                pendentes.setdefault(t_clean, t)
+        transacoes_para_categorizar = list(pendentes.values())
         
         print(f"[INFO] Transações no cache: {transacoes_no_cache}")
         print(f"[INFO] Transações para categorizar: {len(transacoes_para_categorizar)}")
         
-        # Processa em blocos
+        # Processa em blocos; os blocos são independentes e vão em paralelo ao Ollama
         if transacoes_para_categorizar:
-            if tqdm is not None:
-                iterator = tqdm(range(0, len(transacoes_para_categorizar), block_size), desc="Categorizando")
-            else:
-                iterator = range(0, len(transacoes_para_categorizar), block_size)
-                print(f"[INFO] Processando {len(transacoes_para_categorizar)} transações em blocos de {block_size}")
-                
-            for i in iterator:
-                bloco = transacoes_para_categorizar[i:i+block_size]
-                prompt = generate_categorization_prompt(bloco)
-                
+            blocos = [transacoes_para_categorizar[i:i+block_size]
+                      for i in range(0, len(transacoes_para_categorizar), block_size)]
+            workers = max(1, min(CATEGORIZATION_WORKERS, len(blocos)))
+            print(f"[INFO] Processando {len(transacoes_para_categorizar)} transações em {len(blocos)} blocos de {block_size} ({workers} em paralelo)")
+
+            def categorizar_bloco(bloco):
                 try:
-                    resposta = llm.invoke([HumanMessage(content=prompt)])
-                    resultado = parse_llm_categorization_response(resposta.content, bloco)
-                    
+                    resposta = llm.invoke([HumanMessage(content=generate_categorization_prompt(bloco))])
+                    return parse_llm_categorization_response(resposta.content, bloco)
+                except Exception as e:
+                    print(f"[ERROR] Erro ao processar bloco: {e}")
+                    return []
+
+            # map devolve na ordem dos blocos: o merge no cache fica determinístico
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                resultados = ex.map(categorizar_bloco, blocos)
+                if tqdm is not None:
+                    resultados = tqdm(resultados, total=len(blocos), desc="Categorizando")
+
+                for bloco, resultado in zip(blocos, resultados):
                     for trans, cat in resultado:
-                        t_clean = clean_transaction_name(trans)
+                        t_clean = categorization_cache_key(trans)
                         if t_clean not in cache or cache[t_clean] == "Outros":
                             cache[t_clean] = cat
-                    
-                    # Fallback regex para não categorizadas
-                    transacoes_processadas = {clean_transaction_name(trans) for trans, _ in resultado}
+
+                    # Fallback regex para não categorizadas (ou bloco com erro)
+                    transacoes_processadas = {categorization_cache_key(trans) for trans, _ in resultado}
                     for trans in bloco:
-                        t_clean = clean_transaction_name(trans)
+                        t_clean = categorization_cache_key(trans)
                         if t_clean not in transacoes_processadas and t_clean not in cache:
-                            categoria_regex = self._categorize(trans)
-                            cache[t_clean] = categoria_regex
-                            
-                except Exception as e:
-                    print(f"[ERROR] Erro ao processar bloco: {e}")
-                    for trans in bloco:
-                        t_clean = clean_transaction_name(trans)
-                        if t_clean not in cache:
-                            categoria_regex = self._categorize(trans)
-                            cache[t_clean] = categoria_regex
-            
+                            cache[t_clean] = self._categorize(trans)
+
             save_cache(cache, cache_path)
             print(f"[INFO] Cache salvo com {len(cache)} entradas")
         
-        # Aplica categorizações do cache
-        categorias_finais = []
-        for t in transacoes:
-            t_clean = clean_transaction_name(t)
-            categoria = cache.get(t_clean)
-            
-            if categoria:
-                categorias_finais.append(categoria)
-            else:
-                categoria_regex = self._categorize(t)
-                categorias_finais.append(categoria_regex)
+        # Aplica categorizações do cache; o que faltar vai pelo regex vetorizado
+        serie = pd.Series(transacoes, index=df.index, dtype=object)
+        categorias_finais = pd.Series([cache.get(t_clean) or None for t_clean in limpos], index=df.index, dtype=object)
+        faltando = categorias_finais.isna()
+        if faltando.any():
+            categorias_finais[faltando] = self._categorize_series(serie[faltando])
         
-        df_copy["categoria"] = categorias_finais
-        return df_copy
+        # assign devolve um novo DataFrame sem copiar as demais colunas explicitamente
+        return df.assign(categoria=categorias_finais)
     
     def _categorize_with_regex_fallback(self, df):
         """Fallback para categorização usando apenas regex."""
         print("[INFO] Usando categorização fallback com regex")
-        df_copy = df.copy()
-        df_copy["categoria"] = df_copy["descricao"].apply(self._categorize)
-        return df_copy
+        return df.assign(categoria=self._categorize_series(df["descricao"]))
 
-    def _refine_categories_with_llm(self, df, model: Optional[str] = None):
-        """Refina categorias com LLM local."""
-        client = LocalLLMClient()
+    def _refine_categories_with_llm(self, df, model: Optional[str] = None, desc_lower=None):
+        """Refina categorias com LLM local. desc_lower: descrições já em minúsculas (opcional)."""
+        client = get_llm_client()
         model = model or "gemma3"
+        client.warm_up(model)
         
         print(f"🔍 DEBUG - _refine_categories_with_llm usando modelo: {model}")
         
-        uniq = df["descricao"].dropna().astype(str).str.slice(0, 80).unique().tolist()[:100]
-        prompt = (
-            "Você é um classificador de gastos. Mapeie cada descrição para UMA categoria entre: "
-            "Alimentação, Moradia, Serviços, Transporte, Saúde, Lazer, Renda, Transferências, Educação, Outros.\n"
-            "Responda em JSON no formato {\"mappings\": [{\"descricao\": \"...\", \"categoria\": \"...\"}]} sem comentários.\n\n"
-            f"Descrições:\n- " + "\n- ".join(uniq)
-        )
-        try:
-            raw = client.generate(prompt, model=model)
-            data = json.loads(raw)
-            mapping = {m.get("descricao", "").lower(): m.get("categoria", "Outros") for m in data.get("mappings", [])}
-            df["categoria"] = df["descricao"].astype(str).str.lower().map(mapping).fillna(df["categoria"])
-        except Exception:
-            pass
+        # Cache persistente descrição -> categoria: só descrições inéditas vão para o LLM
+        cache_path = os.path.join(os.path.dirname(__file__), "..", REFINE_CACHE_PATH)
+        cache = load_cache(cache_path)
+        
+        # Prompt enxuto: prefixo de 48 caracteres, no máximo 50 descrições distintas
+        if desc_lower is None:
+            desc_lower = df["descricao"].fillna("").astype("string").str.lower()
+        keys_lower = desc_lower.str.slice(0, 48).str.strip()  # filtro de novas e lookup final
+        novas = {}
+        for d_lower, original in zip(keys_lower.tolist(), df["descricao"].tolist()):
+            if d_lower and d_lower not in cache and d_lower not in novas:
+                # Texto original (com maiúsculas) só para as descrições que vão ao prompt
+                novas[d_lower] = str(original)[:48].strip()
+        uniq = list(novas.values())[:50]
+        print(f"🔍 DEBUG - Refinamento: {len(uniq)} descrições novas ({len(cache)} em cache)")
+        
+        if uniq:
+            prompt = (
+                "Você é um classificador de gastos. Mapeie cada descrição para UMA categoria entre: "
+                "Alimentação, Moradia, Serviços, Transporte, Saúde, Lazer, Renda, Transferências, Educação, Outros.\n"
+                "Responda em JSON no formato {\"mappings\": [{\"descricao\": \"...\", \"categoria\": \"...\"}]} sem comentários.\n\n"
+                f"Descrições:\n- " + "\n- ".join(uniq)
+            )
+            try:
+                raw = client.generate(prompt, model=model, format="json")
+                data = _parse_llm_json(raw)
+                novos = {m.get("descricao", "").lower().strip(): m.get("categoria", "Outros") for m in data.get("mappings", [])}
+                if novos:
+                    cache.update(novos)
+                    save_cache(cache, cache_path)
+            except Exception:
+                pass
+        
+        if cache:
+            df["categoria"] = keys_lower.map(cache).fillna(df["categoria"])
         return df
 
 # ----------------------------------------------------------------------------
@@ -837,10 +1503,14 @@ class FinancialAdvisorToolSchema(BaseModel):
     profile_json: Union[str, dict, list] = Field(description="JSON (string ou objeto) do UserProfileBuilderTool")
     transactions_json: Union[str, dict, list] = Field(description="JSON (string, dict ou lista) do BankStatementParserTool com transações categorizadas. OBRIGATÓRIO.")
     ollama_model: Optional[str] = Field(default="gemma3", description="Modelo LLM selecionado no frontend (ex: gemma3, llama2, mistral)")
+    no_cache: bool = Field(default=False, description="Se True, ignora o cache de respostas do LLM e gera um conselho novo")
 
 # Rebuild do modelo para resolver referências
 FinancialAdvisorToolSchema.model_rebuild()
 
+# A partir deste tamanho os totais do FinancialAdvisorTool são calculados com NumPy
+NUMPY_MIN_TRANSACTIONS = 512
+
 class FinancialAdvisorTool(BaseTool):
     """Gera aconselhamento financeiro estruturado com LLM local."""
     name: str = "FinancialAdvisorTool"
@@ -870,48 +1540,59 @@ class FinancialAdvisorTool(BaseTool):
         "ANÁLISE OS DADOS FINANCEIROS E RESPONDA APENAS JSON:"
     )
 
-    def _run(self, profile_json: Any, transactions_json: Any, ollama_model: Optional[str] = None) -> str:
+    def _run(self, profile_json: Any, transactions_json: Any, ollama_model: Optional[str] = None,
+             no_cache: bool = False) -> str:
         """Gera conselhos financeiros personalizados usando LLM local."""
-        from datetime import datetime
-        import json
-
-        client = LocalLLMClient()
+        client = get_llm_client()
+        # Carrega o modelo em paralelo ao parse/montagem do prompt
+        client.warm_up(ollama_model)
         
         print(f"🔍 DEBUG - FinancialAdvisorTool usando modelo: {ollama_model}")
 
         # --- Parse seguro do perfil ---
         try:
-            profile = json.loads(profile_json) if isinstance(profile_json, str) else profile_json
+            profile = _loads(profile_json) if isinstance(profile_json, str) else profile_json
         except Exception as e:
-            return json.dumps({"ok": False, "error": f"Invalid profile_json: {e}"}, ensure_ascii=False)
+            return _dumps({"ok": False, "error": f"Invalid profile_json: {e}"})
 
         # --- Parse seguro das transações ---
         try:
-            tx = json.loads(transactions_json) if isinstance(transactions_json, str) else transactions_json
+            tx = _loads(transactions_json) if isinstance(transactions_json, str) else transactions_json
         except Exception as e:
-            return json.dumps({"ok": False, "error": f"Invalid transactions_json: {e}"}, ensure_ascii=False)
+            return _dumps({"ok": False, "error": f"Invalid transactions_json: {e}"})
 
         # Garante formato padrão para transações
         if isinstance(tx, list):
             tx = {"transacoes": tx, "totais_por_categoria": []}
 
-        transacoes = tx.get("transacoes", [])
+        transacoes = _transaction_records(tx.get("transacoes", []))
         totais_por_categoria = tx.get("totais_por_categoria", [])
 
-        # --- Filtrar apenas top 5 transações que mais movimentaram (por valor absoluto) ---
-        top_5_transacoes = sorted(
-            transacoes, 
-            key=lambda t: abs(float(t.get("valor", 0))), 
-            reverse=True
-        )[:5]
+        if np is not None and len(transacoes) > NUMPY_MIN_TRANSACTIONS:
+            # --- Extratos grandes: totais e top 5 vetorizados em NumPy ---
+            vals = np.fromiter(
+                (float(t.get("valor", 0) or 0) for t in transacoes), dtype=np.float64, count=len(transacoes)
+            )
+            total_despesas = float(-vals[vals < 0].sum())
+            total_receitas = float(vals[vals > 0].sum())
+            top_5_transacoes = [transacoes[i] for i in _top_k_abs_indices(np.abs(vals), 5)]
+        else:
+            # --- Cálculo de totais financeiros (uma passada, um float() por transação) ---
+            valores = []
+            total_despesas = 0.0
+            total_receitas = 0.0
+            for t in transacoes:
+                v = float(t.get("valor", 0) or 0)
+                valores.append(v)
+                if v < 0:
+                    total_despesas -= v
+                else:
+                    total_receitas += v
 
-        # --- Cálculo de totais financeiros ---
-        total_despesas = sum(
-            abs(float(t.get("valor", 0))) for t in transacoes if float(t.get("valor", 0)) < 0
-        )
-        total_receitas = sum(
-            float(t.get("valor", 0)) for t in transacoes if float(t.get("valor", 0)) > 0
-        )
+            # --- Filtrar apenas top 5 transações que mais movimentaram (por valor absoluto) ---
+            top_5_transacoes = [
+                transacoes[i] for i in heapq.nlargest(5, range(len(valores)), key=lambda i: abs(valores[i]))
+            ]
 
         # --- Preparar dados do perfil consolidado ---
         perfil_financeiro = {
@@ -923,26 +1604,12 @@ class FinancialAdvisorTool(BaseTool):
             "total_receitas_calculado": round(total_receitas, 2),
         }
 
-        print(f"🔍 DEBUG FinancialAdvisorTool - Perfil consolidado: {json.dumps(perfil_financeiro, ensure_ascii=False, indent=2)}")
+        if DEBUG_TOOLS:
+            print(f"🔍 DEBUG FinancialAdvisorTool - Perfil consolidado: {_dumps(perfil_financeiro, pretty=True)}")
         print(f"🔍 DEBUG FinancialAdvisorTool - Total transações: {len(transacoes)}")
         print(f"🔍 DEBUG FinancialAdvisorTool - Top 5 transações: {len(top_5_transacoes)}")
         print(f"🔍 DEBUG FinancialAdvisorTool - Total categorias: {len(totais_por_categoria)}")
 
-        # --- Montar contexto limpo e otimizado para LLM ---
-        context = {
-            "perfil": perfil_financeiro,
-            "resumo_gastos_por_categoria": totais_por_categoria,  # TODAS as categorias e valores
-            "top_5_transacoes_maiores": [  # APENAS top 5 transações
-                {
-                    "data": t.get("data"),
-                    "descricao": t.get("descricao"),
-                    "valor": t.get("valor"),
-                    "categoria": t.get("categoria")
-                }
-                for t in top_5_transacoes
-            ]
-        }
-
         # --- Gerar prompt simplificado ---
         prompt = (
             self.SYSTEM_PROMPT
@@ -951,31 +1618,22 @@ class FinancialAdvisorTool(BaseTool):
             + f"Despesas: R$ {perfil_financeiro.get('total_despesas_calculado', 0)}\n"
             + f"Objetivo: {perfil_financeiro.get('objetivo', {}).get('descricao', 'N/A')}\n"
             + f"Meta: R$ {perfil_financeiro.get('objetivo', {}).get('valor_objetivo', 0)}\n"
-            + f"Categorias: {json.dumps(totais_por_categoria[:3], ensure_ascii=False)}\n"
+            + f"Categorias: {_dumps(totais_por_categoria[:3])}\n"
         )
 
-        print(f"🔍 DEBUG FinancialAdvisorTool - Contexto enviado: {json.dumps(context, ensure_ascii=False, indent=2)}")
+        if DEBUG_TOOLS:
+            print(f"🔍 DEBUG FinancialAdvisorTool - Prompt enviado:\n{prompt}")
 
         try:
-            raw = client.generate(prompt, model=ollama_model).strip()
-            print(f"🔍 DEBUG FinancialAdvisorTool - Resposta raw do LLM: {raw}")
+            raw = client.generate(prompt, model=ollama_model, format="json", no_cache=no_cache).strip()
+            if DEBUG_TOOLS:
+                print(f"🔍 DEBUG FinancialAdvisorTool - Resposta raw do LLM: {raw}")
 
             if not raw or raw.strip() == "":
                 raise JSONableError("Empty or whitespace-only response from LLM")
             
-            # Tentar extrair JSON da resposta
-            if not raw.lstrip().startswith("{"):
-                print(f"🔍 DEBUG - Resposta não começa com '{{', tentando extrair JSON...")
-                raw_json = _extract_json(raw)
-            else:
-                raw_json = raw
-
-            print(f"🔍 DEBUG FinancialAdvisorTool - JSON extraído: {raw_json}")
-
-            if not raw_json or raw_json.strip() == "":
-                raise JSONableError("JSON extraction resulted in empty string")
-
-            json_data = json.loads(raw_json)
+            # Com format="json" a resposta já é JSON; extração só como fallback (runner CLI)
+            json_data = _parse_llm_json(raw)
             
             # Normalizar campos obrigatórios
             advice = self._normalize_advice_fields(json_data)
@@ -985,24 +1643,24 @@ class FinancialAdvisorTool(BaseTool):
                 print("[INFO] FinancialAdvisorTool: detectado resposta mínima do LLM, aplicando fallback heurístico")
                 advice = self._build_heuristic_advice(perfil_financeiro, totais_por_categoria, top_5_transacoes)
 
-            return json.dumps({
+            return _dumps({
                 "ok": True,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": _now_iso(),
                 "advice": advice
-            }, ensure_ascii=False)
+            })
             
         except Exception as e:
             print(f"[WARNING] FinancialAdvisorTool: erro com LLM, usando fallback heurístico: {e}")
             # Fallback heurístico completo em caso de falha do LLM
             fallback_advice = self._build_heuristic_advice(perfil_financeiro, totais_por_categoria, top_5_transacoes)
             
-            return json.dumps({
+            return _dumps({
                 "ok": True,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": _now_iso(),
                 "advice": fallback_advice,
                 "fallback_used": True,
                 "llm_error": str(e)
-            }, ensure_ascii=False)
+            })
 
     def _normalize_advice_fields(self, data: dict) -> dict:
         """Normaliza campos obrigatórios do conselho financeiro."""
@@ -1176,11 +1834,28 @@ EVAL_RUBRIC = {
     "completude": "Cobre curto, médio e longo prazo, riscos e métricas? (0-5)",
 }
 
+# Máximo de conselhos avaliados por chamada ao LLM juiz
+JUDGE_BATCH_SIZE = 6
+# Lotes de avaliação enviados simultaneamente ao Ollama (ver OLLAMA_NUM_PARALLEL no servidor)
+JUDGE_WORKERS = int(os.getenv("JUDGE_WORKERS", "4"))
+
+_WORD_RX = re.compile(r"\w+")
+_DIGIT_RX = re.compile(r"\d")
+
+def _heuristic_features(text: str) -> Tuple[int, int, int, int]:
+    """(palavras, tem_numeros, marcos de prazo, parece_json) com uma varredura regex + str.count em C."""
+    word_count = sum(1 for _ in _WORD_RX.finditer(text))
+    has_numbers = 1 if _DIGIT_RX.search(text) else 0
+    marcos = text.count("agora") + text.count("30") + text.count("90") + text.count("12")
+    has_json_like = 1 if (text.lstrip().startswith("{") and text.rstrip().endswith("}")) else 0
+    return word_count, has_numbers, marcos, has_json_like
+
 class ModelEvaluatorToolSchema(BaseModel):
     advices_json: str = Field(description="JSON list with entries: {model: str, advice_json: {..}} or {model, text}")
     profile_json: Optional[str] = Field(default=None, description="Profile JSON to provide context to the judge")
     use_llm_judge: bool = Field(default=True, description="If True, use LLM-as-a-judge; else use heuristics only")
     judge_model: Optional[str] = Field(default="gemma3", description="Modelo LLM para avaliação dos conselhos")
+    no_cache: bool = Field(default=False, description="Se True, ignora o cache de respostas do LLM e reavalia")
 
 class ModelEvaluatorTool(BaseTool):
     name: str = "ModelEvaluator"
@@ -1190,27 +1865,30 @@ class ModelEvaluatorTool(BaseTool):
     )
     args_schema = ModelEvaluatorToolSchema
 
-    def _run(self, advices_json: str, profile_json: Optional[str] = None, use_llm_judge: bool = True, judge_model: Optional[str] = None) -> str:
+    def _run(self, advices_json: str, profile_json: Optional[str] = None, use_llm_judge: bool = True,
+             judge_model: Optional[str] = None, no_cache: bool = False) -> str:
+        if use_llm_judge:
+            get_llm_client().warm_up(judge_model or "gemma3")
         try:
-            items = json.loads(advices_json)
-            profile = json.loads(profile_json) if profile_json else None
+            items = _loads(advices_json)
+            profile = _loads(profile_json) if profile_json else None
         except Exception as e:
-            return json.dumps({"ok": False, "error": f"Invalid JSON: {e}"})
+            return _dumps({"ok": False, "error": f"Invalid JSON: {e}"})
 
         # Normalize to text for evaluation
         normalized: List[Tuple[str, str]] = []  # (model, text)
         for it in items:
             model = it.get("model", "unknown")
             if "advice_json" in it and isinstance(it["advice_json"], dict):
-                text = json.dumps(it["advice_json"], ensure_ascii=False)
+                text = _dumps(it["advice_json"])
             else:
-                text = it.get("text") or json.dumps(it, ensure_ascii=False)
+                text = it.get("text") or _dumps(it)
             normalized.append((model, text))
 
         scores = []
         if use_llm_judge:
             try:
-                scores = self._judge_with_llm(normalized, profile, judge_model=judge_model)
+                scores = self._judge_with_llm(normalized, profile, judge_model=judge_model, no_cache=no_cache)
             except Exception:
                 scores = self._heuristic_scores(normalized)
         else:
@@ -1221,37 +1899,105 @@ class ModelEvaluatorTool(BaseTool):
             sc["total"] = sum(sc.get(k, 0) for k in ["clareza", "aplicabilidade", "consistencia", "completude"])  # type: ignore
         winner = max(scores, key=lambda d: d["total"]) if scores else None
         out = {"ok": True, "timestamp": _now_iso(), "rubric": EVAL_RUBRIC, "scores": scores, "winner": winner}
-        return json.dumps(out, ensure_ascii=False)
+        return _dumps(out)
 
-    def _judge_with_llm(self, pairs: List[Tuple[str, str]], profile: Optional[dict], judge_model: Optional[str] = None) -> List[Dict[str, Any]]:
-        client = LocalLLMClient()
+    def _judge_with_llm(self, pairs: List[Tuple[str, str]], profile: Optional[dict], judge_model: Optional[str] = None,
+                        no_cache: bool = False) -> List[Dict[str, Any]]:
+        client = get_llm_client()
         judge_model = judge_model or "gemma3"
         
         print(f"🔍 DEBUG - _judge_with_llm usando modelo avaliador: {judge_model}")
         
+        profile_txt = _dumps(profile)
+        # Vários conselhos por chamada (lotes de JUDGE_BATCH_SIZE para caber no contexto)
+        chunks = [pairs[i:i + JUDGE_BATCH_SIZE] for i in range(0, len(pairs), JUDGE_BATCH_SIZE)]
+        if not chunks:
+            return []
+
+        def judge_chunk(chunk: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+            try:
+                return self._judge_batch(client, chunk, profile_txt, judge_model, no_cache)
+            except Exception as e:
+                print(f"[WARNING] Avaliação em lote falhou ({e}) — avaliando conselho a conselho")
+                return self._score_many(client, chunk, profile_txt, judge_model, no_cache)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(JUDGE_WORKERS, len(chunks)))) as ex:
+            return [block for blocks in ex.map(judge_chunk, chunks) for block in blocks]
+
+    def _score_one(self, client: LocalLLMClient, pair: Tuple[str, str], profile_txt: str, judge_model: str,
+                   no_cache: bool = False) -> Dict[str, Any]:
+        """Avalia um conselho; se o LLM falhar, usa heurística só para esse modelo."""
+        return self._score_many(client, [pair], profile_txt, judge_model, no_cache)[0]
+
+    def _score_many(self, client: LocalLLMClient, pairs: List[Tuple[str, str]], profile_txt: str, judge_model: str,
+                    no_cache: bool = False) -> List[Dict[str, Any]]:
+        """Avalia conselhos individualmente, com as chamadas em lote (generate_batch);
+        um conselho cujo LLM falhar recebe heurística só para ele."""
+        prompts = [self._judge_one_prompt(model, text, profile_txt) for model, text in pairs]
+        raws = client.generate_batch(prompts, model=judge_model, format="json", return_exceptions=True, no_cache=no_cache)
+        out = []
+        for pair, raw in zip(pairs, raws):
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                data = _parse_llm_json(raw)
+                data["model"] = pair[0]
+                out.append(data)
+            except Exception as e:
+                print(f"[WARNING] Juiz LLM falhou para o modelo {pair[0]} ({e}) — usando heurística")
+                out.append(self._heuristic_scores([pair])[0])
+        return out
+
+    def _judge_batch(self, client: LocalLLMClient, chunk: List[Tuple[str, str]], profile_txt: str, judge_model: str,
+                     no_cache: bool = False) -> List[Dict[str, Any]]:
+        """Avalia um lote de conselhos em uma única chamada; itens ausentes na resposta são avaliados individualmente."""
+        if len(chunk) == 1:
+            return [self._score_one(client, chunk[0], profile_txt, judge_model, no_cache)]
+
+        # Textos já serializados entram como estão (sem re-encode em JSON dentro do prompt)
+        conselhos = "\n\n".join(f"[id {i}] Conselho do modelo {model}:\n{text}" for i, (model, text) in enumerate(chunk))
+        prompt = (
+            "Você é um avaliador rigoroso. Avalie CADA conselho abaixo segundo a rubrica (0-5 por critério) e retorne JSON: "
+            "{\"evaluations\":[{\"id\":int,\"clareza\":int,\"aplicabilidade\":int,\"consistencia\":int,\"completude\":int,\"justificativa\":string}]}, "
+            "com um item por conselho, usando o mesmo id.\n\n"
+            f"Perfil (se houver): {profile_txt}\n\n"
+            f"Conselhos:\n{conselhos}\n"
+        )
+        raw = client.generate(prompt, model=judge_model, format="json", no_cache=no_cache)
+        data = _parse_llm_json(raw)
+        by_id = {}
+        for ev in data.get("evaluations", []):
+            try:
+                by_id[int(ev.pop("id"))] = ev
+            except Exception:
+                continue
+
+        missing = [i for i in range(len(chunk)) if i not in by_id]
+        if missing:
+            by_id.update(zip(missing, self._score_many(client, [chunk[i] for i in missing], profile_txt, judge_model, no_cache)))
+
         blocks = []
-        for model, text in pairs:
-            prompt = (
-                "Você é um avaliador rigoroso. Avalie o conselho abaixo segundo a rubrica (0-5 por critério) e retorne JSON: "
-                "{\"clareza\":int,\"aplicabilidade\":int,\"consistencia\":int,\"completude\":int,\"justificativa\":string}.\n\n"
-                f"Perfil (se houver): {json.dumps(profile, ensure_ascii=False)}\n\n"
-                f"Conselho do modelo {model}:\n{text}\n"
-            )
-            raw = client.generate(prompt, model=judge_model)
-            data = json.loads(_extract_json(raw))
-            data["model"] = model
-            blocks.append(data)
+        for i, (model, _text) in enumerate(chunk):
+            ev = by_id[i]
+            ev["model"] = model
+            blocks.append(ev)
         return blocks
 
+    def _judge_one_prompt(self, model: str, text: str, profile_txt: str) -> str:
+        return (
+            "Você é um avaliador rigoroso. Avalie o conselho abaixo segundo a rubrica (0-5 por critério) e retorne JSON: "
+            "{\"clareza\":int,\"aplicabilidade\":int,\"consistencia\":int,\"completude\":int,\"justificativa\":string}.\n\n"
+            f"Perfil (se houver): {profile_txt}\n\n"
+            f"Conselho do modelo {model}:\n{text}\n"
+        )
+
     def _heuristic_scores(self, pairs: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
         out = []
         for model, text in pairs:
-            word_count = len(re.findall(r"\w+", text))
-            has_json_like = 1 if (text.strip().startswith("{") and text.strip().endswith("}")) else 0
-            has_numbers = 1 if re.search(r"\d", text) else 0
+            word_count, has_numbers, marcos, has_json_like = _heuristic_features(text)
             # crude heuristics
             clareza = min(5, 1 + word_count // 120)
-            completude = min(5, 1 + (text.count("agora") + text.count("30") + text.count("90") + text.count("12")))
+            completude = min(5, 1 + marcos)
             aplicabilidade = min(5, 1 + has_numbers + has_json_like)
             consistencia = 3  # base
             out.append({
@@ -1274,6 +2020,9 @@ class ReportGeneratorArgs(BaseModel):
     evaluation_json: str = Field(description="Scores/winner JSON (from ModelEvaluatorTool)")
     best_advice_json: str = Field(description="Advice JSON (from FinancialAdvisorTool for the winner)")
 
+# Campos de transação exibidos pelo dashboard React
+SAMPLE_TRANSACTION_KEYS = ("data", "descricao", "valor", "categoria")
+
 class ReportGeneratorTool(BaseTool):
     name: str = "ReportGeneratorTool"
     description: str = (
@@ -1283,12 +2032,12 @@ class ReportGeneratorTool(BaseTool):
 
     def _run(self, profile_json: str, statement_json: str, evaluation_json: str, best_advice_json: str) -> str:
         try:
-            profile = json.loads(profile_json)
-            stmt = json.loads(statement_json)
-            evalj = json.loads(evaluation_json)
-            best = json.loads(best_advice_json)
+            profile = _loads(profile_json)
+            stmt = _loads(statement_json)
+            evalj = _loads(evaluation_json)
+            best = _loads(best_advice_json)
         except Exception as e:
-            return json.dumps({"ok": False, "error": f"Invalid JSON inputs: {e}"})
+            return _dumps({"ok": False, "error": f"Invalid JSON inputs: {e}"})
 
         # Extract chart-friendly structures
         spend_by_cat = stmt.get("totais_por_categoria", [])
@@ -1311,7 +2060,11 @@ class ReportGeneratorTool(BaseTool):
             },
             "spending": {
                 "by_category": spend_by_cat,
-                "sample_transactions": stmt.get("transacoes", [])[:100],
+                # Apenas os campos usados pelo dashboard
+                "sample_transactions": [
+                    {k: t.get(k) for k in SAMPLE_TRANSACTION_KEYS}
+                    for t in _transaction_records(stmt.get("transacoes", []), limit=100)
+                ],
             },
             "evaluation": {
                 "rubric": evalj.get("rubric", {}),
@@ -1335,46 +2088,174 @@ class ReportGeneratorTool(BaseTool):
                 ],
             }
         }
-        return json.dumps(payload, ensure_ascii=False)
+        return _dumps(payload)
 
 # ----------------------------------------------------------------------------
 # Helper: JSON extraction (for LLMs that wrap JSON with text)
 # ----------------------------------------------------------------------------
     
+_JSON_DECODER = json.JSONDecoder()
+
 def _extract_json(text: str) -> str:
     """Extrai o primeiro bloco JSON válido de uma string, sem usar regex recursivo (compatível com Python)."""
-    import json
-    
     if not text or text.strip() == "":
         raise ValueError("Texto vazio fornecido para extração de JSON.")
 
-    stack = []
-    start = None
-
-    for i, c in enumerate(text):
-        if c == '{':
-            if not stack:
-                start = i
-            stack.append(c)
-        elif c == '}':
-            if stack:
-                stack.pop()
-                if not stack and start is not None:
-                    candidate = text[start:i + 1]
-                    try:
-                        json.loads(candidate)
-                        return candidate
-                    except Exception:
-                        # continua procurando o próximo bloco
-                        pass
+    # Caminho rápido (orjson): o trecho entre o primeiro "{" e o último "}" já é o JSON
+    # na maioria das respostas (texto puro ou cercado por ```json ... ```)
+    i = text.find('{')
+    j = text.rfind('}')
+    if orjson is not None and 0 <= i < j:
+        candidate = text[i:j + 1]
+        try:
+            if isinstance(orjson.loads(candidate), dict):
+                return candidate
+        except orjson.JSONDecodeError:
+            pass
+
+    # raw_decode (parser C do json) a partir de cada "{": falha rápido em prefixos inválidos
+    while i >= 0:
+        try:
+            _, end = _JSON_DECODER.raw_decode(text, i)
+            return text[i:end]
+        except json.JSONDecodeError:
+            # continua procurando o próximo bloco
+            i = text.find('{', i + 1)
 
     # Se chegar aqui, nenhum JSON válido foi encontrado
     raise ValueError(f"Não foi possível extrair JSON da resposta do modelo. Texto recebido: {text[:200]}...")
 
+def _parse_llm_json(raw: str) -> Any:
+    """Parse direto de respostas em modo JSON; cai para _extract_json se vier texto em volta."""
+    try:
+        return _loads(raw)
+    except ValueError:
+        return _loads(_extract_json(raw))
+
 # ============================================================================
 # 6) DashboardDataCompilerTool (Estruturação para Frontend React)
 # ============================================================================
 
+# Cores e ícones por categoria, compartilhados por todos os gráficos do dashboard
+_DEFAULT_COLOR = "#95A5A6"
+_DEFAULT_ICON = "question"
+_CATEGORY_COLORS = MappingProxyType({
+    "Alimentação": "#FF6B6B", "Moradia": "#4ECDC4", "Transporte": "#45B7D1",
+    "Saúde": "#96CEB4", "Educação": "#FFEAA7", "Lazer": "#DDA0DD",
+    "Serviços": "#98D8C8", "Renda": "#82E0AA", "Transferências": "#D5A6BD",
+    "Mercado": "#FFB347", "Streaming": "#B19CD9", "Investimentos": "#A8E6CF",
+    "Outros": _DEFAULT_COLOR
+})
+_CATEGORY_ICONS = MappingProxyType({
+    "Alimentação": "utensils", "Moradia": "home", "Transporte": "car",
+    "Saúde": "heartbeat", "Educação": "graduation-cap", "Lazer": "gamepad",
+    "Serviços": "cog", "Renda": "dollar-sign", "Transferências": "exchange-alt",
+    "Mercado": "shopping-cart", "Streaming": "play", "Investimentos": "chart-line"
+})
+
+# A partir deste tamanho o top 5 do dashboard é selecionado com NumPy
+DASHBOARD_NUMPY_MIN_TRANSACTIONS = 128
+
+# Aceita apenas objetos/arrays JSON nas entradas do dashboard
+_JSON_ADAPTER = TypeAdapter(Union[dict, list]) if TypeAdapter is not None else None
+
+# Placeholders que o agente às vezes envia no lugar do JSON real
+_JSON_PLACEHOLDERS = frozenset({
+    "<transactions JSON>", "<advice JSON>", "transactions JSON", "advice JSON", "None", ""
+})
+
+# Avaliação usada quando evaluation_json não é fornecido (somente leitura)
+_DEFAULT_EVALUATION = MappingProxyType({
+    "ok": True,
+    "message": "Model evaluation disabled",
+    "model_used": "ollama/gemma3",
+    "scores": (),
+    "winner": MappingProxyType({"model": "gemma3", "total": 0})
+})
+
+# Configuração de UI padrão (sem preferências do usuário)
+_DEFAULT_UI_CONFIG = MappingProxyType({
+    "theme": MappingProxyType({
+        "primary_color": "#2C3E50",
+        "success_color": "#27AE60",
+        "warning_color": "#F39C12",
+        "danger_color": "#E74C3C"
+    }),
+    "chart_preferences": MappingProxyType({
+        "animation_duration": 800,
+        "default_font_family": "Inter, sans-serif"
+    })
+})
+
+# Categorias formam um conjunto pequeno: o cache satura rápido e evita o dispatch de método
+@lru_cache(maxsize=128)
+def _color_for(category: str) -> str:
+    return _CATEGORY_COLORS.get(category, _DEFAULT_COLOR)
+
+@lru_cache(maxsize=128)
+def _icon_for(category: str) -> str:
+    return _CATEGORY_ICONS.get(category, _DEFAULT_ICON)
+
+# orjson >= 3.9.14 emite um Fragment como JSON já pronto, sem percorrer a estrutura de novo
+_DEFAULT_UI_CONFIG_JSON = (
+    orjson.Fragment(_dumps(_DEFAULT_UI_CONFIG)) if orjson is not None and hasattr(orjson, "Fragment") else None
+)
+
+# IDs fixos dos itens de conselho (cada timeline tem no máximo 5)
+_ADVICE_IDS = ("advice_1", "advice_2", "advice_3", "advice_4", "advice_5")
+
+
+def _advice_item(advice_id: str, text: str) -> dict:
+    """Item de conselho do dashboard; título truncado em 50 caracteres."""
+    return {
+        "id": advice_id,
+        "title": text if len(text) <= 50 else text[:50] + "...",
+        "description": text,
+        "impact": "medium",
+        "effort": "medium"
+    }
+
+
+class _CatRow(NamedTuple):
+    """Entrada de `totais_por_categoria` já convertida (sem `.get`/`float` repetidos)."""
+    name: str
+    value: float
+    abs_value: float
+    is_expense: bool
+
+
+class _CategoryTotals(NamedTuple):
+    """Dados derivados das transações, calculados uma vez e compartilhados pelos `_build_*`."""
+    income: float
+    expenses: float
+    net: float
+    savings_rate: float  # % da renda poupada (0 quando não há renda)
+    rows: List[_CatRow]
+    expense_rows: List[_CatRow]
+    counts: Counter
+
+
+def _aggregate(categories: list, raw_transactions: list) -> _CategoryTotals:
+    """Uma passada por `totais_por_categoria` (um float() por entrada) e uma pelas transações."""
+    income = expenses = 0.0
+    rows = []
+    expense_rows = []
+    for cat in categories:
+        valor = float(cat.get("valor", 0))
+        row = _CatRow(cat.get("categoria", "Outros"), valor, abs(valor), valor < 0)
+        rows.append(row)
+        if row.is_expense:
+            expenses += row.abs_value
+            expense_rows.append(row)
+        elif valor > 0:
+            income += valor
+    # Contagem de transações por categoria
+    counts = Counter(t.get("categoria", "Outros") for t in raw_transactions)
+    net = income - expenses
+    savings_rate = (net / income * 100) if income > 0 else 0
+    return _CategoryTotals(income, expenses, net, savings_rate, rows, expense_rows, counts)
+
+
 class DashboardDataCompilerToolSchema(BaseModel):
     transactions_json: Union[str, dict, list] = Field(description="[OBRIGATÓRIO] JSON das transações categorizadas (BankStatementParserTool) com array 'transacoes' e 'totais_por_categoria'")
     advice_json: Union[str, dict, list] = Field(description="[OBRIGATÓRIO] JSON dos conselhos financeiros (FinancialAdvisorTool) contendo plano de ação e recomendações")
@@ -1400,37 +2281,44 @@ class DashboardDataCompilerTool(BaseTool):
         try:
             # Normalizar dados de entrada com validação adicional
             def normalize_json_input(data, field_name: str):
-                if data is None:
-                    return None
-                
-                # Se já é dict, retorna direto
-                if isinstance(data, dict):
+                # Tipos exatos, do caso mais comum (dict já parseado) para o mais raro
+                t = type(data)
+                if t is dict:
                     return data
                 
-                # Se é string
-                if isinstance(data, str):
+                if t is str or t is bytes:
                     # Ignorar placeholders comuns
-                    if data.strip() in ["<transactions JSON>", "<advice JSON>", "transactions JSON", "advice JSON", "None", ""]:
-                        print(f"[ERROR] {field_name} contém placeholder inválido: '{data}'")
+                    if t is str and data.strip() in _JSON_PLACEHOLDERS:
+                        logger.error("%s contém placeholder inválido: '%s'", field_name, data)
                         return None
                     
-                    # Tentar fazer parse do JSON
+                    # Tentar fazer parse do JSON (ValidationError do pydantic também é ValueError)
                     try:
-                        return json.loads(data)
-                    except json.JSONDecodeError as e:
-                        print(f"[ERROR] Falha ao parsear {field_name}: {e}")
-                        print(f"[DEBUG] Conteúdo recebido: {data[:200]}...")
+                        if _JSON_ADAPTER is not None:
+                            return _JSON_ADAPTER.validate_json(data)
+                        return _loads(data)
+                    except ValueError as e:
+                        logger.error("Falha ao parsear %s: %s", field_name, e)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("Conteúdo recebido: %s...", data[:200])
                         return None
                 
+                if data is None:
+                    return None
+                
+                # Subclasses de dict (ex.: OrderedDict) continuam aceitas
+                if isinstance(data, dict):
+                    return data
+                
                 # Tipo não suportado
-                print(f"[ERROR] {field_name} tem tipo não suportado: {type(data)}")
+                logger.error("%s tem tipo não suportado: %s", field_name, t)
                 return None
             
             # Parse dos dados OBRIGATÓRIOS com validação
-            print("[INFO] Parseando transactions_json...")
+            logger.debug("Parseando %s...", "transactions_json")
             transactions = normalize_json_input(transactions_json, "transactions_json")
             
-            print("[INFO] Parseando advice_json...")
+            logger.debug("Parseando %s...", "advice_json")
             advice = normalize_json_input(advice_json, "advice_json")
             
             # Validação crítica com mensagens detalhadas
@@ -1439,18 +2327,22 @@ class DashboardDataCompilerTool(BaseTool):
                     "transactions_json é obrigatório mas está inválido ou ausente. "
                     "Certifique-se de passar o JSON completo retornado pela extract_task."
                 )
-                return json.dumps({"ok": False, "error": error_msg})
+                return _dumps({"ok": False, "error": error_msg})
             
             if advice is None:
                 error_msg = (
                     "advice_json é obrigatório mas está inválido ou ausente. "
                     "Certifique-se de passar o JSON completo retornado pela advice_task."
                 )
-                return json.dumps({"ok": False, "error": error_msg})
+                return _dumps({"ok": False, "error": error_msg})
             
+            # Formato "split" do parser: volta para lista de objetos uma única vez
+            if isinstance(transactions.get("transacoes"), dict):
+                transactions = {**transactions, "transacoes": _transaction_records(transactions["transacoes"])}
+
             # Validação de estrutura mínima
             if not isinstance(transactions.get("transacoes"), list):
-                return json.dumps({
+                return _dumps({
                     "ok": False, 
                     "error": "transactions_json deve conter array 'transacoes'"
                 })
@@ -1460,72 +2352,64 @@ class DashboardDataCompilerTool(BaseTool):
                     "plano" in advice or  # Estrutura nova direta
                     isinstance(advice.get("advice"), dict)  # Estrutura antiga com wrapper
                 )):
-                return json.dumps({
+                return _dumps({
                     "ok": False,
                     "error": "advice_json deve conter dados de plano financeiro válidos"
                 })
             
-            print("[INFO] Dados obrigatórios validados com sucesso")
+            logger.debug("Dados obrigatórios validados com sucesso")
             
             # Parse dos dados OPCIONAIS
             if evaluation_json is None or (isinstance(evaluation_json, str) and evaluation_json.strip() == "None"):
-                evaluation = {
-                    "ok": True,
-                    "message": "Model evaluation disabled",
-                    "model_used": "ollama/gemma3",
-                    "scores": [],
-                    "winner": {"model": "gemma3", "total": 0}
-                }
-                print("[INFO] evaluation_json não fornecido, usando objeto fixo padrão")
+                evaluation = _DEFAULT_EVALUATION
+                logger.debug("evaluation_json não fornecido, usando objeto fixo padrão")
             else:
                 evaluation = normalize_json_input(evaluation_json, "evaluation_json")
                 if evaluation is None:
-                    evaluation = {
-                        "ok": True,
-                        "message": "Model evaluation disabled",
-                        "model_used": "ollama/gemma3",
-                        "scores": [],
-                        "winner": {"model": "gemma3", "total": 0}
-                    }
+                    evaluation = _DEFAULT_EVALUATION
             
-            ui_prefs = json.loads(ui_preferences) if ui_preferences else {}
+            ui_prefs = _loads(ui_preferences) if ui_preferences else {}
             
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"[ERROR] Exception durante parse: {error_details}")
-            return json.dumps({
-                "ok": False, 
-                "error": f"Erro ao parsear JSONs de entrada: {str(e)}",
-                "details": error_details
-            })
+            # exc_info só é formatado se o log for de fato emitido
+            logger.error("Exception durante parse: %s", e, exc_info=True)
+            error = {"ok": False, "error": f"Erro ao parsear JSONs de entrada: {str(e)}"}
+            # Traceback completo na resposta apenas em modo debug
+            if DEBUG_TOOLS:
+                error["details"] = traceback.format_exc()
+            return _dumps(error)
         
         try:
             # Gerar timestamp e metadados
-            now = dt.datetime.now()
+            now = _now_iso()
+            
+            # Totais por categoria calculados uma única vez para todos os blocos
+            agg = _aggregate(transactions.get("totais_por_categoria", []), transactions.get("transacoes", []))
             
             # 1. TRANSACTIONS ANALYSIS - Dados categorizados otimizados para charts
-            transactions_analysis = self._build_transactions_analysis(transactions)
+            transactions_analysis = self._build_transactions_analysis(transactions, agg)
             
             # 2. FINANCIAL ADVICE - Conselhos estruturados por timeline
-            financial_advice = self._build_financial_advice(advice, transactions)
+            financial_advice = self._build_financial_advice(advice, agg)
             
             # 3. VISUALIZATIONS - Datasets prontos para gráficos
-            visualizations = self._build_visualizations(transactions, advice)
+            visualizations = self._build_visualizations(agg, advice)
             
             # 4. COMPARATIVE METRICS - Benchmarks baseados apenas em transações
-            comparative_metrics = self._build_comparative_metrics(transactions)
+            comparative_metrics = self._build_comparative_metrics(agg)
             
             # 5. UI CONFIG - Configurações de tema e layout
             ui_config = self._build_ui_config(ui_prefs)
+            if ui_config is _DEFAULT_UI_CONFIG and _DEFAULT_UI_CONFIG_JSON is not None:
+                ui_config = _DEFAULT_UI_CONFIG_JSON
             
             # 6. ALERTS - Notificações importantes baseadas em transações
-            alerts = self._build_alerts(transactions, advice)
+            alerts = self._build_alerts(agg, advice)
             
             # Compilação final
             dashboard_data = {
                 "metadata": {
-                    "generated_at": now.isoformat(),
+                    "generated_at": now,
                     "data_version": "v1.0",
                     "frontend_compatibility": "react_v18+",
                     "total_data_points": len(transactions.get("transacoes", [])),
@@ -1544,9 +2428,9 @@ class DashboardDataCompilerTool(BaseTool):
                 }
             }
             
-            return json.dumps({
+            return _dumps({
                 "ok": True,
-                "timestamp": now.isoformat(),
+                "timestamp": now,
                 "dashboard_data": dashboard_data,
                 "summary": {
                     "total_categories": len(transactions_analysis.get("categories_breakdown", [])),
@@ -1554,43 +2438,26 @@ class DashboardDataCompilerTool(BaseTool):
                     "charts_configured": len(visualizations),
                     "alerts_count": len(alerts.get("urgent", []) + alerts.get("informational", []))
                 }
-            }, ensure_ascii=False)
+            })
             
         except Exception as e:
-            return json.dumps({"ok": False, "error": f"Erro na compilação do dashboard: {e}"})
+            return _dumps({"ok": False, "error": f"Erro na compilação do dashboard: {e}"})
     
-    def _build_transactions_analysis(self, transactions: dict) -> dict:
+    def _build_transactions_analysis(self, transactions: dict, agg: _CategoryTotals) -> dict:
         """Constrói análise de transações otimizada para visualização"""
-        categories = transactions.get("totais_por_categoria", [])
         raw_transactions = transactions.get("transacoes", [])
         
-        # Cores predefinidas para categorias
-        category_colors = {
-            "Alimentação": "#FF6B6B", "Moradia": "#4ECDC4", "Transporte": "#45B7D1",
-            "Saúde": "#96CEB4", "Educação": "#FFEAA7", "Lazer": "#DDA0DD",
-            "Serviços": "#98D8C8", "Renda": "#82E0AA", "Transferências": "#D5A6BD",
-            "Mercado": "#FFB347", "Streaming": "#B19CD9", "Investimentos": "#A8E6CF",
-            "Outros": "#95A5A6"
-        }
-        
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
+        total_income, total_expenses = agg.income, agg.expenses
         
         categories_breakdown = []
-        for cat in categories:
-            valor = float(cat.get("valor", 0))
-            categoria = cat.get("categoria", "Outros")
-            
-            # Contar transações desta categoria
-            cat_transactions = [t for t in raw_transactions if t.get("categoria") == categoria]
-            
+        for row in agg.rows:
             categories_breakdown.append({
-                "category": categoria,
-                "amount": valor,
-                "percentage": (abs(valor) / total_expenses * 100) if total_expenses > 0 else 0,
-                "transaction_count": len(cat_transactions),
-                "color": category_colors.get(categoria, "#95A5A6"),
-                "icon": self._get_category_icon(categoria),
+                "category": row.name,
+                "amount": row.value,
+                "percentage": (row.abs_value / total_expenses * 100) if total_expenses > 0 else 0,
+                "transaction_count": agg.counts.get(row.name, 0),
+                "color": _color_for(row.name),
+                "icon": _icon_for(row.name),
                 "trend": "stable",
                 "benchmark_comparison": "normal"
             })
@@ -1600,14 +2467,14 @@ class DashboardDataCompilerTool(BaseTool):
                 "total_transactions": len(raw_transactions),
                 "total_expenses": -total_expenses,
                 "total_income": total_income,
-                "net_flow": total_income - total_expenses,
+                "net_flow": agg.net,
                 "analysis_period": transactions.get("timestamp", "")
             },
             "categories_breakdown": sorted(categories_breakdown, key=lambda x: abs(x["amount"]), reverse=True),
             "top_transactions": self._get_top_transactions(raw_transactions)
         }
     
-    def _build_financial_advice(self, advice: dict, transactions: dict) -> dict:
+    def _build_financial_advice(self, advice: dict, agg: _CategoryTotals) -> dict:
         """Estrutura conselhos financeiros por timeline"""
         # Detectar estrutura: nova (direta) ou antiga (com wrapper "advice")
         if "plano" in advice:
@@ -1618,15 +2485,13 @@ class DashboardDataCompilerTool(BaseTool):
             advice_data = advice.get("advice", {})
         
         # Calcular métricas básicas das transações
-        categories = transactions.get("totais_por_categoria", [])
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
-        net_flow = total_income - total_expenses
+        total_income, total_expenses = agg.income, agg.expenses
+        net_flow = agg.net
         
         overall_assessment = {
-            "health_score": self._calculate_health_score_from_transactions(transactions),
-            "main_strengths": self._identify_strengths_from_transactions(transactions),
-            "main_concerns": self._identify_concerns_from_transactions(transactions),
+            "health_score": self._calculate_health_score_from_transactions(agg),
+            "main_strengths": self._identify_strengths_from_transactions(agg),
+            "main_concerns": self._identify_concerns_from_transactions(agg),
             "priority_level": "high" if net_flow < 0 else "medium" if net_flow < total_income * 0.2 else "low"
         }
         
@@ -1645,30 +2510,28 @@ class DashboardDataCompilerTool(BaseTool):
             "alerts": advice_data.get("alertas", [])
         }
     
-    def _build_visualizations(self, transactions: dict, advice: dict) -> dict:
+    def _build_visualizations(self, agg: _CategoryTotals, advice: dict) -> dict:
         """Gera configurações prontas para gráficos"""
-        categories = transactions.get("totais_por_categoria", [])
-        
         # Gráfico de pizza para despesas
         pie_data = []
-        for cat in categories:
-            valor = float(cat.get("valor", 0))
-            if valor < 0:  # Apenas despesas
-                pie_data.append({
-                    "label": cat.get("categoria"),
-                    "value": abs(valor),
-                    "color": self._get_category_color(cat.get("categoria"))
-                })
+        for row in agg.expense_rows:  # Apenas despesas
+            pie_data.append({
+                "label": row.name,
+                "value": row.abs_value,
+                "color": _color_for(row.name)
+            })
         
         # Gráfico de fluxo mensal
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
-        net_savings = total_income - total_expenses
+        total_income, total_expenses = agg.income, agg.expenses
+        net_savings = agg.net
+        
+        # Uma única seleção top-K (O(N log K)); o top 5 é prefixo do top 8
+        top_expenses = heapq.nlargest(8, pie_data, key=lambda x: x["value"])
         
         return {
             "expense_pie_chart": {
                 "chart_type": "pie",
-                "data": pie_data[:8],  # Top 8 categorias
+                "data": top_expenses,  # Top 8 categorias
                 "config": {"responsive": True, "legend_position": "bottom", "show_percentages": True}
             },
             "monthly_flow_chart": {
@@ -1682,19 +2545,17 @@ class DashboardDataCompilerTool(BaseTool):
             },
             "category_trend_chart": {
                 "chart_type": "horizontal_bar",
-                "data": sorted(pie_data, key=lambda x: x["value"], reverse=True)[:5],
+                "data": top_expenses[:5],
                 "config": {"responsive": True}
             }
         }
     
-    def _build_comparative_metrics(self, transactions: dict) -> dict:
+    def _build_comparative_metrics(self, agg: _CategoryTotals) -> dict:
         """Gera métricas comparativas baseadas em transações"""
-        categories = transactions.get("totais_por_categoria", [])
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
+        total_income, total_expenses = agg.income, agg.expenses
         
-        savings_amount = total_income - total_expenses
-        savings_rate = (savings_amount / total_income * 100) if total_income > 0 else 0
+        savings_amount = agg.net
+        savings_rate = agg.savings_rate
         
         return {
             "benchmarks": {
@@ -1713,28 +2574,20 @@ class DashboardDataCompilerTool(BaseTool):
             }
         }
     
-    def _build_ui_config(self, ui_prefs: dict) -> dict:
+    def _build_ui_config(self, ui_prefs: dict) -> Mapping:
         """Configurações de UI e tema"""
+        if "primary_color" not in ui_prefs:
+            return _DEFAULT_UI_CONFIG
         return {
-            "theme": {
-                "primary_color": ui_prefs.get("primary_color", "#2C3E50"),
-                "success_color": "#27AE60",
-                "warning_color": "#F39C12",
-                "danger_color": "#E74C3C"
-            },
-            "chart_preferences": {
-                "animation_duration": 800,
-                "default_font_family": "Inter, sans-serif"
-            }
+            "theme": {**_DEFAULT_UI_CONFIG["theme"], "primary_color": ui_prefs["primary_color"]},
+            "chart_preferences": _DEFAULT_UI_CONFIG["chart_preferences"]
         }
     
-    def _build_alerts(self, transactions: dict, advice: dict) -> dict:
+    def _build_alerts(self, agg: _CategoryTotals, advice: dict) -> dict:
         """Gera alertas baseados em transações e conselhos"""
         alerts = {"urgent": [], "informational": []}
         
-        categories = transactions.get("totais_por_categoria", [])
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
+        total_income, total_expenses = agg.income, agg.expenses
         
         # Alerta de gastos maiores que renda
         if total_expenses > total_income:
@@ -1748,7 +2601,7 @@ class DashboardDataCompilerTool(BaseTool):
             })
         
         # Alerta de baixa taxa de poupança
-        savings_rate = ((total_income - total_expenses) / total_income * 100) if total_income > 0 else 0
+        savings_rate = agg.savings_rate
         if 0 < savings_rate < 10:
             alerts["urgent"].append({
                 "id": "low_savings_rate",
@@ -1761,7 +2614,7 @@ class DashboardDataCompilerTool(BaseTool):
         
         # Alertas dos conselhos LLM
         advice_alerts = advice.get("advice", {}).get("alertas", [])
-        for i, alert_text in enumerate(advice_alerts[:3]):  # Máximo 3 alertas
+        for i, alert_text in enumerate(islice(advice_alerts, 3)):  # Máximo 3 alertas
             alerts["informational"].append({
                 "id": f"llm_alert_{i}",
                 "type": "info",
@@ -1774,11 +2627,9 @@ class DashboardDataCompilerTool(BaseTool):
         return alerts
     
     # Métodos auxiliares simplificados
-    def _calculate_health_score_from_transactions(self, transactions: dict) -> float:
+    def _calculate_health_score_from_transactions(self, agg: _CategoryTotals) -> float:
         """Calcula score de saúde financeira baseado apenas em transações"""
-        categories = transactions.get("totais_por_categoria", [])
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
+        total_income, total_expenses = agg.income, agg.expenses
         
         if total_income == 0:
             return 3.0
@@ -1788,93 +2639,64 @@ class DashboardDataCompilerTool(BaseTool):
         
         return max(0, min(10, round(score, 1)))
     
-    def _identify_strengths_from_transactions(self, transactions: dict) -> list:
+    def _identify_strengths_from_transactions(self, agg: _CategoryTotals) -> list:
         """Identifica pontos fortes baseados em transações"""
         strengths = []
         
-        categories = transactions.get("totais_por_categoria", [])
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
+        total_income, total_expenses = agg.income, agg.expenses
         
         if total_income > total_expenses:
-            savings = total_income - total_expenses
-            strengths.append(f"Saldo positivo de R$ {savings:.2f}")
+            strengths.append(f"Saldo positivo de R$ {agg.net:.2f}")
         
         if total_income > 0:
-            savings_rate = (total_income - total_expenses) / total_income * 100
+            savings_rate = agg.savings_rate
             if savings_rate > 20:
                 strengths.append(f"Boa taxa de poupança ({savings_rate:.1f}%)")
         
         return strengths
     
-    def _identify_concerns_from_transactions(self, transactions: dict) -> list:
+    def _identify_concerns_from_transactions(self, agg: _CategoryTotals) -> list:
         """Identifica preocupações baseadas em transações"""
         concerns = []
         
-        categories = transactions.get("totais_por_categoria", [])
-        total_income = sum(float(cat.get("valor", 0)) for cat in categories if float(cat.get("valor", 0)) > 0)
-        total_expenses = sum(abs(float(cat.get("valor", 0))) for cat in categories if float(cat.get("valor", 0)) < 0)
+        total_income, total_expenses = agg.income, agg.expenses
         
         if total_expenses > total_income:
             concerns.append("Gastos superiores à renda")
         
         if total_income > 0:
-            savings_rate = (total_income - total_expenses) / total_income * 100
+            savings_rate = agg.savings_rate
             if savings_rate < 10:
                 concerns.append(f"Taxa de poupança muito baixa ({savings_rate:.1f}%)")
         
         return concerns
     
     # Métodos auxiliares mantidos do código original
-    def _get_category_color(self, category: str) -> str:
-        colors = {
-            "Alimentação": "#FF6B6B", "Moradia": "#4ECDC4", "Transporte": "#45B7D1",
-            "Saúde": "#96CEB4", "Educação": "#FFEAA7", "Lazer": "#DDA0DD",
-            "Serviços": "#98D8C8", "Renda": "#82E0AA", "Transferências": "#D5A6BD",
-            "Mercado": "#FFB347", "Streaming": "#B19CD9", "Investimentos": "#A8E6CF"
-        }
-        return colors.get(category, "#95A5A6")
-    
-    def _get_category_icon(self, category: str) -> str:
-        icons = {
-            "Alimentação": "utensils", "Moradia": "home", "Transporte": "car",
-            "Saúde": "heartbeat", "Educação": "graduation-cap", "Lazer": "gamepad",
-            "Serviços": "cog", "Renda": "dollar-sign", "Transferências": "exchange-alt",
-            "Mercado": "shopping-cart", "Streaming": "play", "Investimentos": "chart-line"
-        }
-        return icons.get(category, "question")
-    
     def _extract_timeline_advice(self, advice_data) -> list:
-        structured_advice = []
-        
         # Se for uma string simples, criar um item único
         if isinstance(advice_data, str):
-            if advice_data.strip():  # Só processar se não for vazio
-                structured_advice.append({
-                    "id": "advice_1",
-                    "title": advice_data[:50] + "..." if len(advice_data) > 50 else advice_data,
-                    "description": advice_data,
-                    "impact": "medium",
-                    "effort": "medium"
-                })
-        # Se for uma lista, processar cada item
-        elif isinstance(advice_data, list):
-            for i, advice in enumerate(advice_data[:5]):
-                if isinstance(advice, str) and advice.strip():
-                    structured_advice.append({
-                        "id": f"advice_{i+1}",
-                        "title": advice[:50] + "..." if len(advice) > 50 else advice,
-                        "description": advice,
-                        "impact": "medium",
-                        "effort": "medium"
-                    })
-        
-        return structured_advice
+            return [_advice_item(_ADVICE_IDS[0], advice_data)] if advice_data.strip() else []
+        # Se for uma lista, processar cada item (no máximo 5)
+        if isinstance(advice_data, list):
+            return [
+                _advice_item(_ADVICE_IDS[i], advice)
+                for i, advice in enumerate(islice(advice_data, 5))
+                if isinstance(advice, str) and advice.strip()
+            ]
+        return []
     
     def _get_top_transactions(self, transactions: list) -> list:
-        sorted_tx = sorted(transactions, key=lambda x: abs(float(x.get("valor", 0))), reverse=True)
+        if np is not None and len(transactions) >= DASHBOARD_NUMPY_MIN_TRANSACTIONS:
+            # Extratos grandes: seleção do top 5 vetorizada (O(N))
+            abs_vals = np.fromiter(
+                (_abs_val(t) for t in transactions), dtype=np.float64, count=len(transactions)
+            )
+            top = [transactions[i] for i in _top_k_abs_indices(abs_vals, 5)]
+        else:
+            top = heapq.nlargest(5, transactions, key=_abs_val)
+        
         top_transactions = []
-        for tx in sorted_tx[:5]:
+        for tx in top:
             valor = float(tx.get("valor", 0))
             top_transactions.append({
                 "description": tx.get("descricao", ""),
@@ -1927,4 +2749,6 @@ __all__ = [
     "ReportGeneratorArgs",
     "DashboardDataCompilerArgs",
     "LocalLLMClient",
+    "get_llm_client",
+    "invalidate_profile_cache",
 ]
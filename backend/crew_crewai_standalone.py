@@ -8,16 +8,24 @@ e uso de agentes LLM apenas para tarefas que exigem raciocínio complexo.
 
 Fluxo:
 1. Construir perfil (DIRETO)
-2. Extrair e categorizar transações (AGENTE)
+2. Extrair e categorizar transações (DIRETO)
 3. Gerar conselhos financeiros (AGENTE)
 4. Compilar dashboard (DIRETO)
 """
 import re
-import json
 import os
+import logging
+import asyncio
 import sys
+import hashlib
+import tempfile
+import unicodedata
+import numpy as np
+import pathlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, Any, Optional
+from functools import cached_property, lru_cache
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
 # Adicionar path para importar as ferramentas
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -30,24 +38,170 @@ from crewai.tools import BaseTool
 from crew.tools import (
     BankStatementParserTool, 
     FinancialAdvisorTool,
-    DashboardDataCompilerTool
+    DashboardDataCompilerTool,
+    BLOCO_TAMANHO,
+    CREW_MAX_PARALLEL,
+    CREW_VERBOSE,
+    DEBUG_TOOLS,
+    _dumps,
+    _dumpb,
+    _extract_json,
+    _loads,
+    _now_iso,
 )
 from pydantic import BaseModel, Field
 
-# Define chave dummy para evitar erro interno de validação
-os.environ["OPENAI_API_KEY"] = "dummy"
+def _configure_env() -> None:
+    """Variáveis de ambiente do CrewAI (idempotente; não sobrescreve valores existentes)."""
+    # Define chave dummy para evitar erro interno de validação
+    os.environ.setdefault("OPENAI_API_KEY", "dummy")
 
-# Desabilita checagem de modelo OpenAI
-os.environ["CREWAI_LLM_PROVIDER"] = "ollama"
+    # Desabilita checagem de modelo OpenAI
+    os.environ.setdefault("CREWAI_LLM_PROVIDER", "ollama")
 
-# (opcional) evita chamadas externas para OpenAI
-os.environ["CREWAI_USE_LOCAL_LLM_ONLY"] = "true"
+    # (opcional) evita chamadas externas para OpenAI
+    os.environ.setdefault("CREWAI_USE_LOCAL_LLM_ONLY", "true")
 
-# Configuração do LLM para agentes
-llm = LLM(
-    model="ollama/gemma3",
-    base_url="http://localhost:11434"
-)
+    # Mantém o modelo carregado entre usuários (preserva o prefixo já processado)
+    os.environ.setdefault("OLLAMA_KEEP_ALIVE", "60m")
+
+
+# Pool limitado para as análises síncronas: o executor padrão do asyncio cresce com a carga
+CREW_EXECUTOR = ThreadPoolExecutor(max_workers=CREW_MAX_PARALLEL, thread_name_prefix="crew")
+
+@lru_cache(maxsize=1)
+def get_llm() -> LLM:
+    """Configuração do LLM para agentes (criado uma vez, na primeira utilização)."""
+    _configure_env()
+    return LLM(
+        model="ollama/gemma3",
+        base_url="http://localhost:11434"
+    )
+
+logger = logging.getLogger(__name__)
+
+def _ensure_log_handler() -> None:
+    """
+    Garante que o progresso da análise apareça quando o módulo é importado
+    (ex.: pela API) sem logging configurado: sem nenhum handler na hierarquia,
+    anexa um StreamHandler a este logger. Quem configura logging
+    (basicConfig no __main__, uvicorn etc.) não é afetado.
+    """
+    if not logger.hasHandlers():
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        if logger.level == logging.NOTSET:
+            logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+
+# Padrões de _clean_json_text, compilados uma única vez
+_RE_MD_OPEN = re.compile(r"^[`']{3,}\s*json\s*", re.IGNORECASE)
+_RE_MD_CLOSE = re.compile(r"[`']{3,}\s*$")
+_RE_JSON_TAG = re.compile(r"</?json>", re.IGNORECASE)
+
+def _atomic_write_json(path: Any, obj: Any) -> None:
+    """Grava JSON (objeto indentado ou string já serializada) num .tmp e troca com os.replace,
+    sem deixar arquivos parcialmente escritos."""
+    data = obj.encode("utf-8") if isinstance(obj, str) else _dumpb(obj, pretty=True)
+    # Temporário único por escrita: gravações concorrentes no mesmo destino não
+    # trocam o arquivo uma da outra (o último os.replace vence)
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(os.path.abspath(path)), prefix=f"{os.path.basename(path)}.",
+        suffix=".tmp", delete=False
+    ) as f:
+        try:
+            f.write(data)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        try:
+            os.unlink(f.name)
+        except OSError:
+            pass
+        raise
+
+# Cache em disco dos conselhos, endereçado pelo conteúdo (usuário + transações + modelo)
+# (ancorado no diretório do módulo, independente do cwd)
+ADVICE_CACHE_DIR = pathlib.Path(os.path.dirname(os.path.abspath(__file__))) / ".advice_cache"
+ADVICE_CACHE_MAX = 256  # entradas; as menos usadas recentemente são removidas
+
+def _advice_cache_key(user_data: Dict[str, Any], extract_data: Dict[str, Any], model: str) -> str:
+    """Hash estável das entradas do conselho (o perfil/extrato têm timestamps, por isso não entram)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(_dumps(user_data).encode("utf-8"))
+    h.update(b"|")
+    h.update(_dumps([extract_data.get("transacoes", []), extract_data.get("totais_por_categoria", [])]).encode("utf-8"))
+    h.update(b"|")
+    h.update(model.encode("utf-8"))
+    return h.hexdigest()
+
+def _advice_cache_get(key: str) -> Optional[str]:
+    path = ADVICE_CACHE_DIR / f"{key}.json"
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+    os.utime(path)  # marca como usado recentemente (LRU por mtime)
+    return text
+
+def _advice_cache_put(key: str, text: str) -> None:
+    try:
+        ADVICE_CACHE_DIR.mkdir(exist_ok=True)
+        _atomic_write_json(ADVICE_CACHE_DIR / f"{key}.json", text)
+        entries = sorted(ADVICE_CACHE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for old in entries[:-ADVICE_CACHE_MAX]:
+            old.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning("⚠️ Não foi possível gravar o cache de conselhos: %s", e)
+
+def _preview(text: str, limit: int = 180) -> str:
+    """Trecho inicial de `text` para o prompt, sem separar um caractere de seus acentos
+    combinantes; "..." apenas quando o texto foi de fato cortado."""
+    if len(text) <= limit:
+        return text
+    while limit > 0 and unicodedata.combining(text[limit]):
+        limit -= 1
+    return text[:limit] + "..."
+
+# Parte fixa da tarefa de conselhos. O KV cache do Ollama só reaproveita prefixos idênticos,
+# então nada específico do usuário pode aparecer antes do fim deste bloco.
+STATIC_ADVICE_PREFIX = """
+            GERAR CONSELHOS FINANCEIROS PERSONALIZADOS
+
+            Você é um consultor financeiro especializado em fornecer conselhos personalizados com base no perfil financeiro e nas transações categorizadas do usuário. 
+            Gere um aconselhamento financeiro detalhado com base no perfil do usuário e nas transações categorizadas.
+            O perfil descreve metas, renda, hábitos e objetivos. O objetivo, o perfil e as transações categorizadas estão no final desta tarefa.
+
+            Action: FinancialAdvisorTool
+            Action Input: {
+                "profile_json": { ... },
+                "transactions_json": { ... },
+                "model": "gemma3"
+            }
+
+            Use a ferramenta FinancialAdvisorTool para formatar a resposta final em JSON:
+            {
+            "resumo": "...",
+            "alertas": ["..."],
+            "plano": {
+                "agora": ["..."],
+                "30_dias": ["..."],
+                "12_meses": ["..."]
+            },
+            "metas_mensuraveis": [
+                {"meta": "...", "kpi": "...", "meta_num": 0, "prazo_meses": 12}
+            ]
+            }
+
+            REGRAS IMPORTANTES:
+            NÃO escreva nenhum texto fora do JSON.
+            NUNCA use ações como "Manual Response Generation" ou "Final Answer".
+            A única ação válida é "FinancialAdvisorTool".
+"""
 
 class StandaloneUserProfileBuilderToolSchema(BaseModel):
     user_data_json: Any = Field(description="JSON string OU objeto dict com dados do usuário")
@@ -61,91 +215,106 @@ class StandaloneUserProfileBuilderTool(BaseTool):
 
     def _run(self, user_data_json: Any) -> str:
         """Constrói perfil financeiro."""
-        try:
-            if isinstance(user_data_json, dict):
-                user_data = user_data_json
-            else:
-                user_data = json.loads(user_data_json)
-            
-            # Processar dados
-            dependents = user_data.get("dependents", [])
-            total_dependents = len(dependents) if isinstance(dependents, list) else 0
-            
-            idade = int(user_data.get("age", 30))
-            renda = float(user_data.get("monthly_income", 5000))
-            risk_profile = user_data.get("risk_profile", "moderado")
-            
-            financial_goal = user_data.get("financial_goal", "Reserva de emergência")
-            target_amount = float(user_data.get("target_amount", 1200))
-            time_frame = user_data.get("time_frame", "1 ano")
-            
+        return self.run_batch([user_data_json])[0]
+
+    def run_batch(self, users: List[Any]) -> List[str]:
+        """
+        Constrói os perfis de vários usuários de uma vez (na ordem recebida).
+
+        A leitura dos campos é feita por usuário (um erro vira {"ok": false} só na posição
+        dele); capacidade de poupança, savings_rate, prazo estimado e classificação de
+        risco são calculados em NumPy sobre todos os usuários válidos.
+        """
+        resultados: List[Optional[str]] = [None] * len(users)
+        validos = []  # (posição, user_data, idade, renda, valor_objetivo, debt_to_income)
+        dtis = []     # debt_to_income como float, só para os cálculos
+        for i, user_data_json in enumerate(users):
+            try:
+                if isinstance(user_data_json, dict):
+                    user_data = user_data_json
+                else:
+                    user_data = _loads(user_data_json)
+                debt_to_income = user_data.get("debt_to_income_ratio", 0.2)
+                registro = (
+                    i,
+                    user_data,
+                    int(user_data.get("age", 30)),
+                    float(user_data.get("monthly_income", 5000)),
+                    float(user_data.get("target_amount", 1200)),
+                    debt_to_income,
+                )
+                if isinstance(debt_to_income, str):
+                    raise TypeError("debt_to_income_ratio deve ser numérico")
+                dtis.append(float(debt_to_income))
+                validos.append(registro)
+            except Exception as e:
+                resultados[i] = _dumps({"ok": False, "error": f"Erro ao construir perfil: {str(e)}"})
+
+        if validos:
+            _, _, idades, rendas, alvos, _ = zip(*validos)
+            idade = np.array(idades, dtype=np.int64)
+            renda = np.array(rendas, dtype=np.float64)
+            alvo = np.array(alvos, dtype=np.float64)
+            dti = np.array(dtis, dtype=np.float64)
+
             estimated_expenses = renda * 0.7
             savings_capacity = renda - estimated_expenses
-            debt_to_income = user_data.get("debt_to_income_ratio", 0.2)
-            
-            perfil = {
-                "ok": True,
-                "timestamp": datetime.now().isoformat(),
-                "profile_id": f"standalone_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                "usuario_id": user_data.get("user_id", 1),
-                "dados_pessoais": {
-                    "idade": idade,
-                    "renda_mensal": renda,
-                    "total_dependentes": total_dependents,
-                    "detalhes_dependentes": dependents,
-                    "risk_profile": risk_profile,
-                    "transportation_methods": user_data.get("transportation_methods", ""),
-                },
-                "capacidade_poupanca": savings_capacity,
-                "debt_to_income": debt_to_income,
-                "savings_rate": (savings_capacity / renda * 100) if renda > 0 else 0,
-                "objetivo": {
-                    "descricao": financial_goal,
-                    "valor_objetivo": target_amount,
-                    "prazo": time_frame,
-                    "meses_estimados_pelo_fluxo": int(target_amount / savings_capacity) if savings_capacity > 0 else 999
-                },
-                "classificacao_risco": self._classify_risk(debt_to_income, savings_capacity, idade)
-            }
-            
-            return json.dumps(perfil, ensure_ascii=False)
-            
-        except Exception as e:
-            return json.dumps({"ok": False, "error": f"Erro ao construir perfil: {str(e)}"})
-    
-    def _classify_risk(self, debt_ratio: float, savings: float, age: int) -> str:
-        """Classifica perfil de risco financeiro."""
-        risk_score = 0
-        
-        if debt_ratio < 0.2:
-            risk_score += 4
-        elif debt_ratio < 0.3:
-            risk_score += 3
-        elif debt_ratio < 0.5:
-            risk_score += 2
-        else:
-            risk_score += 1
-            
-        if savings > 2000:
-            risk_score += 3
-        elif savings > 1000:
-            risk_score += 2
-        elif savings > 0:
-            risk_score += 1
-            
-        if age < 30:
-            risk_score += 2
-        elif age < 50:
-            risk_score += 3
-        else:
-            risk_score += 1
-            
-        if risk_score >= 8:
-            return "Baixo Risco"
-        elif risk_score >= 6:
-            return "Risco Moderado" 
-        else:
-            return "Alto Risco"
+            with np.errstate(divide="ignore", invalid="ignore"):
+                savings_rate = savings_capacity / renda * 100  # renda <= 0 vira 0 na montagem
+                meses = np.where(savings_capacity > 0, np.trunc(alvo / savings_capacity), 999)
+            risco = self._classify_risk(dti, savings_capacity, idade)
+
+            now = _now_iso()
+            stamp = now[:19].replace('-', '').replace(':', '').replace('T', '_')
+            linhas = zip(validos, savings_capacity.tolist(), savings_rate.tolist(), meses.tolist(), risco.tolist())
+            for (i, user_data, idade_i, renda_i, alvo_i, dti_i), savings_i, rate_i, meses_i, risco_i in linhas:
+                dependents = user_data.get("dependents", [])
+                perfil = {
+                    "ok": True,
+                    "timestamp": now,
+                    # Sufixo aleatório garante unicidade dentro do mesmo segundo
+                    "profile_id": f"standalone_{stamp}_{os.urandom(3).hex()}",
+                    "usuario_id": user_data.get("user_id", 1),
+                    "dados_pessoais": {
+                        "idade": idade_i,
+                        "renda_mensal": renda_i,
+                        "total_dependentes": len(dependents) if isinstance(dependents, list) else 0,
+                        "detalhes_dependentes": dependents,
+                        "risk_profile": user_data.get("risk_profile", "moderado"),
+                        "transportation_methods": user_data.get("transportation_methods", ""),
+                    },
+                    "capacidade_poupanca": savings_i,
+                    "debt_to_income": dti_i,
+                    "savings_rate": rate_i if renda_i > 0 else 0,
+                    "objetivo": {
+                        "descricao": user_data.get("financial_goal", "Reserva de emergência"),
+                        "valor_objetivo": alvo_i,
+                        "prazo": user_data.get("time_frame", "1 ano"),
+                        "meses_estimados_pelo_fluxo": int(meses_i)
+                    },
+                    "classificacao_risco": risco_i
+                }
+                resultados[i] = _dumps(perfil)
+
+        return resultados
+
+    def _classify_risk(self, debt_ratio, savings, age):
+        """Classifica perfil de risco financeiro (arrays NumPy, um elemento por usuário)."""
+        risk_score = (
+            np.select([debt_ratio < 0.2, debt_ratio < 0.3, debt_ratio < 0.5], [4, 3, 2], default=1)
+            + np.select([savings > 2000, savings > 1000, savings > 0], [3, 2, 1], default=0)
+            + np.select([age < 30, age < 50], [2, 3], default=1)
+        )
+        return np.select(
+            [risk_score >= 8, risk_score >= 6], ["Baixo Risco", "Risco Moderado"], default="Alto Risco"
+        )
+
+# Ferramentas sem estado por execução: uma instância por processo, compartilhada
+# entre análises (inclusive as concorrentes de run_many)
+_PROFILE_TOOL = StandaloneUserProfileBuilderTool()
+_BANK_TOOL = BankStatementParserTool()
+_ADVISOR_TOOL = FinancialAdvisorTool()
+_DASHBOARD_TOOL = DashboardDataCompilerTool()
 
 # ============================================================================
 # CREW STANDALONE ROBUSTA
@@ -156,25 +325,11 @@ class StandaloneFinancialAdvisorCrew:
     
     def __init__(self, user_data: Dict[str, Any]):
         self.user_data = user_data
-        self.user_data_json = json.dumps(user_data, ensure_ascii=False)
-    
-    def create_data_extractor_agent(self) -> Agent:
-        """Cria agente extrator de dados financeiros."""
-        return Agent(
-        role="Analista Financeiro de Transações",
-        goal="Extrair e categorizar transações financeiras de extratos bancários CSV, identificando padrões de gastos e oportunidades de economia.",
-        backstory=(
-            "Você é um especialista em finanças pessoais e tem como missão identificar padrões "
-            "de consumo e categorizar transações bancárias de forma precisa e organizada. "
-            "Seu trabalho é a base para que o consultor financeiro possa gerar conselhos personalizados."
-        ),
-            verbose=True,
-            llm=llm,
-            tools=[BankStatementParserTool()],
-            memory=True,
-            allow_delegation=False,
-            max_iter=1
-        )
+
+    @cached_property
+    def user_data_json(self) -> str:
+        """user_data serializado, gerado só no primeiro acesso (o pipeline usa o dict)."""
+        return _dumps(self.user_data)
     
     def create_financial_advisor_agent(self) -> Agent:
         """Cria agente consultor financeiro."""
@@ -187,44 +342,17 @@ class StandaloneFinancialAdvisorCrew:
                 "gerar conselhos. NUNCA invente ações como 'return the JSON content' ou "
                 "similares. Sua única ação válida é 'FinancialAdvisor'."
             ),
-            verbose=True,
-            llm=llm,
-            tools=[FinancialAdvisorTool()],
+            verbose=CREW_VERBOSE,
+            llm=get_llm(),
+            tools=[_ADVISOR_TOOL],
             allow_delegation=False,
             memory=False,
             max_iter=1
         )
     
-    def create_extract_task(self, agent: Agent, csv_file_path: str, categorization_method: str = "ollama") -> Task:
-        """Cria task de extração de dados."""
-        return Task(
-            description = f"""
-            Você deve processar o extrato bancário diretamente usando a ferramenta BankStatementParserTool.
-
-            Action: BankStatementParserTool
-            Action Input: {{
-            "file_path": "{csv_file_path}",
-            "llm_enhanced": false,
-            "categorization_method": "{categorization_method}",
-            "ollama_model": "gemma3",
-            "block_size": 10
-            }}
-            Retorne APENAS o JSON gerado pela ferramenta como resultado final.
-            """,
-            expected_output="""
-            JSON estruturado contendo:
-            - ok: true
-            - transacoes: array completo com data, descricao, valor, categoria
-            - totais_por_categoria: array com categoria e valor total
-            - n_transacoes: quantidade total
-            - timestamp: data/hora do processamento
-            """,
-            agent=agent,
-            llm=llm,
-            output_file="extract_result.json"
-        )
-    
-    def create_advice_task(self, agent: Agent, profile_json: str, transactions_json: str) -> Task:
+    def create_advice_task(self, agent: Agent, profile_json: str, transactions_json: str,
+                           profile_data: Optional[Dict[str, Any]] = None,
+                           profile_preview: Optional[str] = None) -> Task:
         """Cria task de geração de conselhos com instruções rígidas para evitar corrupção de JSON.
 
         Estratégias aplicadas:
@@ -233,11 +361,15 @@ class StandaloneFinancialAdvisorCrew:
         - Formato único e validável para Action / Action Input
         - Regras de validação embutidas para o modelo seguir
         - Reforço de NÃO duplicar ou alterar campos
+
+        profile_data / profile_preview: perfil já parseado e trecho já calculado pelo
+        chamador, para não repetir o parse e o corte a cada task criada.
         """
 
         # Extrair metadados do objetivo para reforço contextual (não re-injetar JSON completo)
         try:
-            profile_data = json.loads(profile_json)
+            if profile_data is None:
+                profile_data = _loads(profile_json)
             objetivo = profile_data.get("objetivo", {})
             objetivo_desc = objetivo.get("descricao", "Não definido")
             objetivo_valor = objetivo.get("valor_objetivo", 0)
@@ -248,60 +380,46 @@ class StandaloneFinancialAdvisorCrew:
             objetivo_prazo = "Não definido"
 
          # Evita erro caso o transactions_json venha de contexto (None)
-        preview_tx = transactions_json[:180] + "..." if transactions_json else "[Será obtido do contexto anterior]"
-        description = f"""
-            GERAR CONSELHOS FINANCEIROS PERSONALIZADOS
-
+        preview_tx = transactions_json if transactions_json else "[Será obtido do contexto anterior]"
+        # Instruções fixas primeiro (prefixo reaproveitado no KV cache do Ollama),
+        # dados do usuário apenas no final
+        description = STATIC_ADVICE_PREFIX + f"""
             OBJETIVO PRINCIPAL: {objetivo_desc} | META: R$ {objetivo_valor:,.2f} | PRAZO: {objetivo_prazo}
 
-            Você é um consultor financeiro especializado em fornecer conselhos personalizados com base no perfil financeiro e nas transações categorizadas do usuário. 
-            Gere um aconselhamento financeiro detalhado com base no perfil do usuário e nas transações categorizadas.
-            O perfil descreve metas, renda, hábitos e objetivos. As transações categorizadas virão do contexto anterior.
-
             Perfil (resumo):
-            {profile_json[:180]}...
+            {profile_preview if profile_preview is not None else _preview(profile_json)}
 
             Transações:
             {preview_tx}
 
-            Action: FinancialAdvisorTool
-            Action Input: {{
-                "profile_json": {{ ... }},
-                "transactions_json": {{ ... }},
-                "model": "gemma3"
-            }}
-
-            Use a ferramenta FinancialAdvisorTool para formatar a resposta final em JSON:
-            {{
-            "resumo": "...",
-            "alertas": ["..."],
-            "plano": {{
-                "agora": ["..."],
-                "30_dias": ["..."],
-                "12_meses": ["..."]
-            }},
-            "metas_mensuraveis": [
-                {{"meta": "...", "kpi": "...", "meta_num": 0, "prazo_meses": 12}}
-            ]
-            }}
-
-            REGRAS IMPORTANTES:
-            NÃO escreva nenhum texto fora do JSON.
-            NUNCA use ações como "Manual Response Generation" ou "Final Answer".
-            A única ação válida é "FinancialAdvisorTool".
-
             Responda APENAS com JSON válido.
         """
         return Task(
             description=description,
             expected_output="JSON válido contendo campos: resumo, alertas, plano, metas_mensuraveis.",
             agent=agent,
-            tools=[FinancialAdvisorTool()],
-            llm=llm,
+            tools=[_ADVISOR_TOOL],
+            llm=get_llm(),
             max_iter=1,
             #context={"use_previous_output": True},
-            output_file="advice_result.json"
+            # A saída é lida da própria task; o arquivo serve apenas para depuração
+            output_file="advice_result.json" if DEBUG_TOOLS else None
+        )
+    def _extract_transactions(self, csv_file_path: str, categorization_method: str) -> Tuple[str, Dict[str, Any]]:
+        """Extrai e categoriza as transações chamando o BankStatementParserTool diretamente
+        (sem agente intermediário: nenhuma chamada ao LLM só para repassar os parâmetros)."""
+        extract_result = _BANK_TOOL._run(
+            file_path=csv_file_path,
+            llm_enhanced=False,
+            categorization_method=categorization_method,
+            ollama_model="gemma3",
+            block_size=BLOCO_TAMANHO
         )
+        extract_data = _loads(extract_result)
+        if not extract_data.get("ok"):
+            raise Exception(f"Erro ao extrair transações: {extract_data.get('error')}")
+        return extract_result, extract_data
+
     def _clean_json_text(self, text: str) -> str:
         """
         Remove delimitadores Markdown (```json ... ``` ou '''json ... ''') e espaços extras
@@ -309,204 +427,251 @@ class StandaloneFinancialAdvisorCrew:
         """
         if not text:
             return ""
+        cleaned = text.strip()
+        # Caso comum: nada de Markdown nem <json> para remover
+        if cleaned[:1] not in ("`", "'") and cleaned[-1:] not in ("`", "'") and "json>" not in cleaned.lower():
+            return cleaned
         # Remove delimitadores iniciais como ```json ou '''json
-        cleaned = re.sub(r"^[`']{3,}\s*json\s*", "", text.strip(), flags=re.IGNORECASE)
+        cleaned = _RE_MD_OPEN.sub("", cleaned)
         # Remove delimitadores finais como ``` ou '''
-        cleaned = re.sub(r"[`']{3,}\s*$", "", cleaned.strip())
+        cleaned = _RE_MD_CLOSE.sub("", cleaned.strip())
         # Remove eventuais marcadores <json> ou </json>
-        cleaned = re.sub(r"<\/?json>", "", cleaned.strip(), flags=re.IGNORECASE)
+        cleaned = _RE_JSON_TAG.sub("", cleaned.strip())
         return cleaned.strip()
 
-    def run_complete_analysis(self, csv_file_path: str, categorization_method: str = "ollama") -> Dict[str, Any]:
+    def run_complete_analysis(self, csv_file_path: str, categorization_method: str = "ollama",
+                              cache: bool = True, profile_result: Optional[str] = None) -> Dict[str, Any]:
         """
-        Executa análise financeira completa com dois agentes CrewAI em pipeline sequencial:
+        Executa análise financeira completa:
         1. Construir perfil (direto)
-        2. Extrair transações (agente)
-        3. Gerar conselhos (agente)
+        2. Extrair transações (direto, em paralelo com a etapa 1)
+        3. Gerar conselhos (agente CrewAI; reaproveitados do cache se as entradas forem idênticas)
         4. Compilar dashboard (direto)
+
+        cache=False ignora o cache de conselhos, força uma nova geração e regrava a entrada.
+        profile_result: perfil já construído (ex.: run_batch em run_many); pula a etapa 1.
         """
-        print("\n" + "=" * 80)
-        print("🤖 SISTEMA DE ANÁLISE FINANCEIRA - VERSÃO INTEGRADA (2 AGENTES CREWAI)")
-        print("=" * 80)
+        _ensure_log_handler()
+        logger.info("=" * 80)
+        logger.info("🤖 SISTEMA DE ANÁLISE FINANCEIRA - VERSÃO INTEGRADA (AGENTE CREWAI)")
+        logger.info("=" * 80)
 
         try:
             # ================================================================
-            # ETAPA 1: CONSTRUIR PERFIL (EXECUÇÃO DIRETA)
+            # ETAPA 1 e 2: PERFIL E EXTRAÇÃO EM PARALELO (EXECUÇÃO DIRETA)
             # ================================================================
-            print("\n📊 ETAPA 1: Construindo perfil financeiro...")
-            profile_tool = StandaloneUserProfileBuilderTool()
-            profile_result = profile_tool._run(user_data_json=self.user_data)
-            profile_data = json.loads(profile_result)
+            logger.info("📊 ETAPAS 1 e 2: Construindo perfil e extraindo transações em paralelo...")
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = {pool.submit(self._extract_transactions, csv_file_path, categorization_method): "extract"}
+                if profile_result is None:
+                    futures[pool.submit(_PROFILE_TOOL._run, user_data_json=self.user_data)] = "profile"
+                results = {"profile": profile_result}
+                for future in as_completed(futures):
+                    # future.result() propaga a primeira exceção
+                    results[futures[future]] = future.result()
+            profile_result = results["profile"]
+            extract_result, extract_data = results["extract"]
+
+            # Mesmo arquivo que a extract_task gerava (apenas para depuração)
+            if DEBUG_TOOLS:
+                _atomic_write_json("extract_result.json", extract_result)
+
+            profile_data = _loads(profile_result)
             if not profile_data.get("ok"):
                 raise Exception(f"Erro ao construir perfil: {profile_data.get('error')}")
-            print(f"✅ Perfil construído com sucesso para {self.user_data.get('user_id', 'usuário')}")
+            logger.info("✅ Perfil construído com sucesso para %s", self.user_data.get('user_id', 'usuário'))
 
             # ================================================================
-            # ETAPA 2 e 3: CREW SEQUENCIAL COM DOIS AGENTES
+            # ETAPA 3: CONSELHOS (AGENTE CREWAI)
             # ================================================================
-            print("\n🤝 Iniciando pipeline integrada (Extração ➜ Aconselhamento)...")
-
-            # Criação dos agentes
-            data_extractor = self.create_data_extractor_agent()
-            financial_advisor = self.create_financial_advisor_agent()
-
-            # Criação das tasks
-            extract_task = self.create_extract_task(
-                agent=data_extractor,
-                csv_file_path=csv_file_path,
-                categorization_method=categorization_method
-            )
-
-            # Minificar perfil para reduzir tokens
-            profile_min = json.dumps(profile_data, ensure_ascii=False, separators=(",", ":"))
-
-            advice_task = self.create_advice_task(
-                agent=financial_advisor,
-                profile_json=profile_min,
-                transactions_json=None
-            )
-            
-            advice_task.context = [extract_task]  # ✅ referência direta
-
-            # Criar crew com memória compartilhada
-            crew_pipeline = Crew(
-                agents=[data_extractor, financial_advisor],
-                tasks=[extract_task, advice_task],
-                process=Process.sequential,
-                llm=llm,
-                memory=True,
-                shared_memory=True,
-                verbose=True
-            )
+            logger.info("🤝 Iniciando aconselhamento...")
 
-            # Rodar crew completa
-            pipeline_result = crew_pipeline.kickoff()
+            advice_key = _advice_cache_key(self.user_data, extract_data, "ollama/gemma3")
+            advice_result = _advice_cache_get(advice_key) if cache else None
+            advice_from_cache = advice_result is not None
 
-            print("\n🤝 Pipeline integrada concluída. Validando resultados...")
-            print(pipeline_result)
-
-            with open("extract_result.json", "r", encoding="utf-8") as f:
-                extract_result = f.read()
-            with open("advice_result.json", "r", encoding="utf-8") as f:
-                advice_result = f.read()
+            if advice_from_cache:
+                logger.info("♻️ Conselhos reaproveitados do cache (entradas idênticas)")
+            else:
+                financial_advisor = self.create_financial_advisor_agent()
+
+                # O builder já devolve JSON minificado: reaproveita sem re-serializar
+                profile_min = profile_result
+
+                advice_task = self.create_advice_task(
+                    agent=financial_advisor,
+                    profile_json=profile_min,
+                    transactions_json=extract_result,
+                    profile_data=profile_data,
+                    profile_preview=_preview(profile_min),
+                )
+
+                crew_pipeline = Crew(
+                    agents=[financial_advisor],
+                    tasks=[advice_task],
+                    process=Process.sequential,
+                    llm=get_llm(),
+                    memory=False,
+                    verbose=CREW_VERBOSE
+                )
+
+                pipeline_result = crew_pipeline.kickoff()
+
+                logger.info("🤝 Pipeline integrada concluída. Validando resultados...")
+                logger.debug("%s", pipeline_result)
+
+                # Saída em memória da task (sem ida ao disco nem arquivo compartilhado
+                # entre análises rodando em paralelo)
+                tasks_output = getattr(pipeline_result, "tasks_output", None) or []
+                task_output = tasks_output[0] if tasks_output else getattr(advice_task, "output", None)
+                if task_output is not None and getattr(task_output, "raw", None):
+                    advice_result = task_output.raw
+                else:
+                    # CrewOutput.__str__ devolve o raw da última task
+                    advice_result = str(pipeline_result)
 
-            print("\n✅ Pipeline CrewAI executada com sucesso.")
-            # extract_data = json.loads(extract_result)
+                logger.info("✅ Pipeline CrewAI executada com sucesso.")
             # advice_data = json.loads(advice_result)
 
-            extract_result_clean = self._clean_json_text(extract_result)
+            # extract_result vem direto da ferramenta: JSON já válido, sem limpeza
             advice_result_clean = self._clean_json_text(advice_result)
 
             try:
-                extract_data = json.loads(extract_result_clean)
-            except json.JSONDecodeError as e:
-                print("❌ Falha ao interpretar o JSON de extract_result:")
-                print(f"🔹 Erro: {e}")
-                print(f"🔹 Conteúdo bruto (primeiros 400 chars):\n{extract_result[:400]}")
-                raise
-
-            try:
-                advice_data = json.loads(advice_result_clean)
-            except json.JSONDecodeError as e:
-                import re
-                match = re.search(r'\{(?:[^{}]|(?R))*\}', advice_result_clean, re.DOTALL)
-                if match:
-                    try:
-                        advice_data = json.loads(match.group(0))
-                        print("✅ JSON extraído automaticamente do texto!")
-                    except Exception:
-                        advice_data = {"ok": False, "error": "Falha ao extrair JSON de advice_result."}
-                else:
-                    advice_data = {
-                        "ok": False,
-                        "error": "O modelo não retornou JSON. Conteúdo bruto foi texto em linguagem natural."
-                    }
-
-                print(f"🪶 Preview da saída original (200 chars):\n{advice_result_clean[:200]}\n")
-                raise
-
-            print("✅ JSONs carregados com sucesso!")
-            print(f"📦 extract_result contém {len(extract_data.get('transacoes', []))} transações.")
-            print(f"🧠 advice_result contém plano: {advice_data.get('resumo', '')[:80]}...\n")
-
-            with open("extract_result_clean.json", "w", encoding="utf-8") as f:
-                json.dump(extract_data, f, ensure_ascii=False, indent=2)
-
-            with open("advice_result_clean.json", "w", encoding="utf-8") as f:
-                json.dump(advice_data, f, ensure_ascii=False, indent=2)
-
-            print("💾 Resultados limpos salvos como:")
-            print("   • extract_result_clean.json")
-            print("   • advice_result_clean.json\n")
+                advice_data = _loads(advice_result_clean)
+            except ValueError:
+                # Texto em volta do JSON: localiza o primeiro objeto válido
+                # (o `re` do Python não suporta o padrão recursivo (?R))
+                try:
+                    advice_result = _extract_json(advice_result_clean)
+                    advice_data = _loads(advice_result)
+                    # Segue com o JSON recuperado (o cache guarda a versão limpa); só registra
+                    logger.warning("⚠️ Saída do modelo com texto em volta do JSON; JSON extraído automaticamente. "
+                                   "Preview (200 chars):\n%s", advice_result_clean[:200])
+                except ValueError:
+                    logger.error("❌ O modelo não retornou JSON. Conteúdo bruto foi texto em linguagem natural.")
+                    logger.error("🪶 Preview da saída original (200 chars):\n%s", advice_result_clean[:200])
+                    raise
+
+            # Só grava quando houve geração nova (cache hit já está em disco)
+            if not advice_from_cache:
+                _advice_cache_put(advice_key, advice_result)
+
+            logger.info("✅ JSONs carregados com sucesso!")
+            logger.info("📦 extract_result contém %d transações.", len(extract_data.get('transacoes', [])))
+            logger.info("🧠 advice_result contém plano: %s...", advice_data.get('resumo', '')[:80])
+
+            if DEBUG_TOOLS:
+                _atomic_write_json("extract_result_clean.json", extract_data)
+                _atomic_write_json("advice_result_clean.json", advice_data)
+
+                logger.info("💾 Resultados limpos salvos como:")
+                logger.info("   • extract_result_clean.json")
+                logger.info("   • advice_result_clean.json")
 
             # ================================================================
             # ETAPA 4: COMPILAR DASHBOARD (EXECUÇÃO DIRETA)
             # ================================================================
-            print("\n📊 ETAPA 4: Compilando dados para dashboard...")
+            logger.info("📊 ETAPA 4: Compilando dados para dashboard...")
 
-            try:
-                advice_json_obj = json.loads(advice_result_clean)
-                if "advice" not in advice_json_obj:
-                    advice_json_obj = {"advice": advice_json_obj}
-                advice_for_dashboard = json.dumps({"advice": advice_json_obj}, ensure_ascii=False)
-            except Exception:
-                # fallback se não for JSON válido
-                print(f"⚠️ Falha ao processar advice_result: {e}")
-                advice_for_dashboard = json.dumps({"advice": {"ok": False, "error": "advice_result inválido"}}, ensure_ascii=False)
-
-            dashboard_tool = DashboardDataCompilerTool()
-            dashboard_result = dashboard_tool._run(
-                transactions_json=extract_result_clean,
+            # Os dados já parseados vão direto como dict (o compilador aceita dicts sem novo parse)
+            advice_json_obj = advice_data
+            if not isinstance(advice_json_obj, dict) or "advice" not in advice_json_obj:
+                advice_json_obj = {"advice": advice_json_obj}
+            advice_for_dashboard = {"advice": advice_json_obj}
+
+            dashboard_result = _DASHBOARD_TOOL._run(
+                transactions_json=extract_data,
                 advice_json=advice_for_dashboard,
-                evaluation_json=json.dumps({
+                evaluation_json={
                     "ok": True,
                     "message": "LLM local executado com sucesso",
                     "model_used": "ollama/gemma3"
-                })
+                }
             )
 
-            dashboard_data = json.loads(dashboard_result)
+            dashboard_data = _loads(dashboard_result)
             if not dashboard_data.get("ok"):
                 raise Exception(f"Erro no dashboard: {dashboard_data.get('error')}")
 
-            print("\n✅ Dashboard compilado com sucesso!")
+            logger.info("✅ Dashboard compilado com sucesso!")
             summary = dashboard_data.get("summary", {})
-            print(f"   • Categorias: {summary.get('total_categories', 0)}")
-            print(f"   • Conselhos: {summary.get('advice_items', 0)}")
+            logger.info("   • Categorias: %s", summary.get('total_categories', 0))
+            logger.info("   • Conselhos: %s", summary.get('advice_items', 0))
 
             # ================================================================
             # SALVAR RESULTADOS
             # ================================================================
+            now = datetime.now()
+            # Usuário + sufixo aleatório (como o profile_id do run_batch): análises concorrentes
+            # do run_many que terminam no mesmo segundo não sobrescrevem os arquivos umas das outras
+            user_tag = re.sub(r"[^\w-]", "_", str(self.user_data.get("user_id") or "usuario"))
+            suffix = f"{now.strftime('%Y%m%d_%H%M%S')}_{user_tag}_{os.urandom(3).hex()}"
             output = {
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
                 "profile": profile_data,
                 "transactions": extract_data,
                 "advice": advice_data,
                 "dashboard": dashboard_data,
                 "metadata": {
                     "csv_file": csv_file_path,
-                    "user_data": self.user_data,
+                    # user_data já está resumido em "profile"
+                    "user_id": self.user_data.get("user_id"),
                     "llm_model": "ollama/gemma3"
                 }
             }
 
-            output_file = f"financial_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(output, f, ensure_ascii=False, indent=2)
-
-            print(f"\n💾 Resultados salvos em: {output_file}")
-            print("=" * 80)
-            print("🎉 Análise completa com sucesso!")
-            print("=" * 80)
+            # As transações vão para um arquivo próprio; o principal guarda só a referência
+            transactions_file = f"transactions_{suffix}.json"
+            _atomic_write_json(transactions_file, extract_data)
+            output_file = f"financial_analysis_{suffix}.json"
+            _atomic_write_json(output_file, {
+                **output,
+                "transactions": {"path": transactions_file, "n": len(extract_data.get("transacoes", []))},
+            })
+
+            logger.info("💾 Resultados salvos em: %s (transações em %s)", output_file, transactions_file)
+            logger.info("=" * 80)
+            logger.info("🎉 Análise completa com sucesso!")
+            logger.info("=" * 80)
             output["success"] = True
             return output
 
         except Exception as e:
-            import traceback
-            print("\n❌ ERRO NA EXECUÇÃO:", e)
-            print(traceback.format_exc())
+            logger.exception("❌ ERRO NA EXECUÇÃO: %s", e)
             return {"success": False, "error": str(e)}
 
+    async def run_complete_analysis_async(self, csv_file_path: str, categorization_method: str = "ollama",
+                                          cache: bool = True, profile_result: Optional[str] = None) -> Dict[str, Any]:
+        """Versão assíncrona de run_complete_analysis (roda no CREW_EXECUTOR, sem bloquear o event loop)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            CREW_EXECUTOR, self.run_complete_analysis, csv_file_path, categorization_method, cache, profile_result
+        )
+
+    @staticmethod
+    async def run_many(items: Iterable[Tuple[Dict[str, Any], str]], max_concurrency: int = CREW_MAX_PARALLEL,
+                       categorization_method: str = "ollama") -> List[Any]:
+        """Analisa vários usuários em paralelo.
+
+        items: pares (user_data, csv_file_path). No máximo `max_concurrency` análises
+        rodam ao mesmo tempo; exceções são devolvidas na posição do item. Os perfis de
+        todos os usuários são construídos antes, num único run_batch.
+        """
+        items = list(items)
+        sem = asyncio.Semaphore(max_concurrency)
+        profiles = _PROFILE_TOOL.run_batch([user_data for user_data, _ in items])
+
+        async def _one(user_data: Dict[str, Any], csv_file_path: str, profile_result: str) -> Dict[str, Any]:
+            async with sem:
+                crew = StandaloneFinancialAdvisorCrew(user_data)
+                return await crew.run_complete_analysis_async(
+                    csv_file_path, categorization_method, profile_result=profile_result
+                )
+
+        return await asyncio.gather(
+            *(_one(u, c, p) for (u, c), p in zip(items, profiles)), return_exceptions=True
+        )
+
 # ============================================================================
 # FUNÇÃO DE DEMONSTRAÇÃO
 # ============================================================================
@@ -573,4 +738,5 @@ def demo_crew_analysis():
         print(f"Erro: {results['error']}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
     demo_crew_analysis()
\ No newline at end of file
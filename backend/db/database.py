@@ -1,6 +1,6 @@
 # Conexão com a database
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 from dotenv import load_dotenv
 import os
 
@@ -19,11 +19,21 @@ engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
     pool_recycle=300,
-    echo=True  # Remover em produção
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+    pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "5")),
+    # Cache de SQL compilado (SQLAlchemy 1.4+); consultas repetidas não são recompiladas
+    query_cache_size=1200,
+    connect_args={"charset": "utf8mb4", "use_unicode": True},
+    # Log de cada statement só para depuração (SQL_ECHO=1)
+    echo=os.getenv("SQL_ECHO", "0") == "1"
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessão por thread, reutilizada pelas tools das crews (leituras)
+ScopedSession = scoped_session(SessionLocal)
+
 def get_db():
     """Dependency para obter sessão do banco de dados"""
     db = SessionLocal()
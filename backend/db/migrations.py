@@ -0,0 +1,25 @@
+# Migrações idempotentes aplicadas na inicialização da API
+# (o banco não é criado via create_all, então índices novos dos modelos precisam ser criados aqui)
+from sqlalchemy import inspect
+
+from db.database import engine
+from db.models import Base
+
+# Índices declarados em models.py que bancos já existentes podem não ter
+MANAGED_INDEXES = (
+    "ix_pf_user_date",
+    "ix_llm_pf_date",
+)
+
+def ensure_indexes() -> None:
+    """Cria os índices de MANAGED_INDEXES que ainda não existem (tabelas ausentes são ignoradas)."""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        indexes = [ix for ix in table.indexes if ix.name in MANAGED_INDEXES]
+        if not indexes or not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                print(f"[INFO] Índice {index.name} criado em {table.name}")
@@ -1,7 +1,7 @@
 # Modelos SQLAlchemy
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 
 Base = declarative_base()
@@ -24,10 +24,16 @@ class FinancialProfile(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    questionnaire_data = Column(Text, nullable=False)  # JSON com respostas do questionário
-    objetivo = Column(Text, nullable=True)  # JSON com objetivo financeiro
-    extrato = Column(Text, nullable=False)  # JSON com extrato bancário
+    # Colunas JSON (grupo "payload") só são lidas sob demanda ou com undefer_group("payload")
+    questionnaire_data = deferred(Column(Text, nullable=False), group="payload")  # JSON com respostas do questionário
+    objetivo = deferred(Column(Text, nullable=True), group="payload")  # JSON com objetivo financeiro
+    extrato = deferred(Column(Text, nullable=False), group="payload")  # JSON com extrato bancário
     data_criado = Column(DateTime, default=datetime.utcnow)
+
+    # Índice composto para buscar o perfil mais recente de cada usuário
+    __table_args__ = (
+        Index("ix_pf_user_date", usuario_id, data_criado.desc()),
+    )
     
     # Relacionamentos
     usuario = relationship("Usuario", back_populates="perfil_financeiro")
@@ -41,11 +47,17 @@ class LLMResponse(Base):
     # Pela Arq de Software, a resposta das LLMs tem que buscar o perfil financeiro do usuario
     perfil_financeiro_id = Column(Integer, ForeignKey("perfil_financeiro.id"), nullable=False)
     modelo_ia = Column(String(100), nullable=False)  # Nome do modelo de IA utilizado 
-    transactions_response = Column(Text, nullable=False)  # JSON com a extração e categorização das transações
-    advice_response = Column(Text, nullable=False)  # JSON com o conselho da LLM
-    dashboard_response = Column(Text, nullable=False)  # JSON com o dashboard gerado
-    score = Column(Text, nullable=False)  # JSON com métricas de comparação
+    # Respostas JSON (grupo "payload") adiadas como em FinancialProfile
+    transactions_response = deferred(Column(Text, nullable=False), group="payload")  # JSON com a extração e categorização das transações
+    advice_response = deferred(Column(Text, nullable=False), group="payload")  # JSON com o conselho da LLM
+    dashboard_response = deferred(Column(Text, nullable=False), group="payload")  # JSON com o dashboard gerado
+    score = deferred(Column(Text, nullable=False), group="payload")  # JSON com métricas de comparação
     data_criado = Column(DateTime, default=datetime.utcnow)
     
+    # Índice composto para buscar a(s) análise(s) mais recente(s) de cada perfil
+    __table_args__ = (
+        Index("ix_llm_pf_date", perfil_financeiro_id, data_criado.desc()),
+    )
+    
     # Relacionamentos
     perfil_financeiro = relationship("FinancialProfile", back_populates="llm_responses")
\ No newline at end of file
@@ -0,0 +1,48 @@
+# Cache de respostas dos LLMs usados pelos agentes (langchain)
+import os
+from typing import Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_community.cache import RedisCache, SQLiteCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Validade das respostas no Redis (padrão: 4h)
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(4 * 60 * 60)))
+
+# Fallback local quando não há Redis configurado
+LLM_CACHE_SQLITE_PATH = os.getenv(
+    "LLM_CACHE_SQLITE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "langchain_cache.sqlite3")
+)
+
+def configure_llm_cache(redis_url: Optional[str] = None, enabled: bool = False) -> Optional[BaseCache]:
+    """
+    Registra o cache global do langchain para todas as chamadas de LLM.
+
+    A chave é (prompt, parâmetros do LLM) — modelo e temperatura fazem parte dela,
+    então respostas de modelos diferentes nunca se misturam. Usa Redis quando
+    `redis_url` está definido (e o pacote `redis` instalado); caso contrário, SQLite.
+    Opt-in: sem `enabled` (settings.llm_cache_enabled) nada é registrado.
+    """
+    if not enabled:
+        return None
+
+    if redis_url and redis is not None:
+        try:
+            client = redis.Redis.from_url(redis_url)
+            client.ping()
+            cache = RedisCache(redis_=client, ttl=LLM_CACHE_TTL)
+            set_llm_cache(cache)
+            print(f"[DEBUG] Cache de LLM no Redis ({redis_url}, ttl={LLM_CACHE_TTL}s)")
+            return cache
+        except redis.RedisError as e:
+            print(f"[WARNING] Redis indisponível para cache de LLM, usando SQLite: {e}")
+
+    cache = SQLiteCache(database_path=LLM_CACHE_SQLITE_PATH)
+    set_llm_cache(cache)
+    return cache
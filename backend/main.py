@@ -2,24 +2,50 @@ from crewai import Agent, Task, Crew, Process
 from crewai.tools import BaseTool
 from langchain_community.llms import Ollama
 import yaml
-from typing import Dict, Any
+from typing import Dict, Any, List, AsyncIterator, Tuple
 import asyncio
+import threading
+from functools import lru_cache
+
+from middleware.configs import settings
+from crew.tools import CREW_VERBOSE
+from llm.cache import configure_llm_cache
+
+# Respostas repetidas (mesmo modelo + prompt) não voltam ao Ollama — só com LLM_CACHE_ENABLED=true
+configure_llm_cache(settings.redis_url, enabled=settings.llm_cache_enabled)
+
+# Limita quantos usuários são processados ao mesmo tempo (o Ollama local é o gargalo)
+_CREW_SEMAPHORE = asyncio.Semaphore(settings.crew_max_parallel)
+
+@lru_cache(maxsize=None)
+def _load_config(path: str) -> Dict[str, Any]:
+    """Lê e parseia um YAML de configuração uma única vez por processo"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+_LLMS: Dict[str, Ollama] = {}
+_LLMS_LOCK = threading.Lock()
+
+def get_llms() -> Dict[str, Ollama]:
+    """Clientes Ollama compartilhados por todas as crews do processo (um por modelo)"""
+    if not _LLMS:
+        with _LLMS_LOCK:
+            if not _LLMS:
+                _LLMS.update({
+                    'llama2': Ollama(model="llama2:7b"),
+                    'mistral': Ollama(model="mistral:7b"),
+                    'gemma3': Ollama(model="gemma3:7b")
+                })
+    return _LLMS
 
 class FinancialAdvisorCrew:
     def __init__(self):
-        # Carregar configurações
-        with open('./crewai/agents.yaml', 'r', encoding='utf-8') as f:
-            self.agents_config = yaml.safe_load(f)
-        
-        with open('./crewai/tasks.yaml', 'r', encoding='utf-8') as f:
-            self.tasks_config = yaml.safe_load(f)
+        # Carregar configurações (cacheadas; não mutar)
+        self.agents_config = _load_config('./crewai/agents.yaml')
+        self.tasks_config = _load_config('./crewai/tasks.yaml')
         
         # Configurar LLMs locais
-        self.llms = {
-            'llama2': Ollama(model="llama2:7b"),
-            'mistral': Ollama(model="mistral:7b"),
-            'gemma3': Ollama(model="gemma3:7b")
-        }
+        self.llms = get_llms()
         
         # Inicializar ferramentas
         self.tools = self._initialize_tools()
@@ -27,16 +53,13 @@ class FinancialAdvisorCrew:
         # Criar agentes
         self.agents = self._create_agents()
         
-        # Criar tarefas
-        self.tasks = self._create_tasks()
+        # Agrupar tarefas em ondas pelo DAG de dependências: tarefas da mesma onda
+        # não dependem entre si e rodam em paralelo
+        self.task_deps = self._task_dependencies()
+        self.waves = self._build_waves(self.task_deps)
         
-        # Criar crew
-        self.crew = Crew(
-            agents=list(self.agents.values()),
-            tasks=list(self.tasks.values()),
-            process=Process.sequential,
-            verbose=True
-        )
+        # Criar tarefas (em ordem topológica, para o contexto já existir)
+        self.tasks = self._create_tasks()
     
     def _create_agents(self) -> Dict[str, Agent]:
         agents = {}
@@ -57,43 +80,104 @@ class FinancialAdvisorCrew:
         
         return agents
     
+    # LLM específico de cada agente (nome do modelo em get_llms())
+    _LLM_FOR_AGENT = {
+        'data_collector': 'llama2',  # Melhor para coleta de dados
+        'data_analyst': 'llama2',      # Melhor para análise de dados
+        'financial_advisor': 'llama2',    # Melhor para conselhos
+        'report_generator': 'llama2',  # Melhor para estruturação
+        'model_evaluator': 'llama2',     # Melhor para avaliação
+    }
+    
     def _select_llm_for_agent(self, agent_name: str):
         """Seleciona LLM específico para cada agente"""
-        llm_mapping = {
-            'data_collector': self.llms['llama2'],  # Melhor para coleta de dados
-            'data_analyst': self.llms['llama2'],      # Melhor para análise de dados
-            'financial_advisor': self.llms['llama2'],    # Melhor para conselhos      # Melhor para avaliação
-            'report_generator': self.llms['llama2'],  # Melhor para estruturação
-            'model_evaluator': self.llms['llama2'],     # Melhor para avaliação
-        }
-        return llm_mapping.get(agent_name, self.llms['llama2'])
+        return self.llms[self._LLM_FOR_AGENT.get(agent_name, 'llama2')]
     
     def _create_tasks(self) -> Dict[str, Task]:
         tasks = {}
         
-        for task_name, config in self.tasks_config.items():
-            # Encontrar contexto (dependências)
-            context_tasks = []
-            if 'context' in config:
-                context_tasks = [tasks[ctx] for ctx in config['context'] if ctx in tasks]
-            
-            tasks[task_name] = Task(
-                description=config['description'],
-                expected_output=config['expected_output'],
-                agent=self.agents[config['agent']],
-                context=context_tasks
-            )
+        for wave in self.waves:
+            for task_name in wave:
+                config = self.tasks_config[task_name]
+                tasks[task_name] = Task(
+                    description=config['description'],
+                    expected_output=config['expected_output'],
+                    agent=self.agents[config['agent']],
+                    context=[tasks[dep] for dep in self.task_deps[task_name]]
+                )
         
         return tasks
     
+    def _task_dependencies(self) -> Dict[str, List[str]]:
+        """Dependências de cada tarefa: o `context` declarado ou, sem ele, a tarefa
+        anterior do tasks.yaml (a saída que o Process.sequential repassaria)"""
+        names = list(self.tasks_config)
+        deps: Dict[str, List[str]] = {}
+        for i, task_name in enumerate(names):
+            config = self.tasks_config[task_name]
+            if 'context' not in config:
+                deps[task_name] = names[i - 1:i]
+                continue
+            unknown = [ctx for ctx in config['context'] if ctx not in self.tasks_config]
+            if unknown:
+                raise ValueError(f"Tarefa '{task_name}' depende de tarefas inexistentes: {unknown}")
+            deps[task_name] = list(config['context'])
+        return deps
+    
+    @staticmethod
+    def _build_waves(deps: Dict[str, List[str]]) -> List[List[str]]:
+        """Ordenação topológica por níveis (Kahn): cada onda só depende das anteriores"""
+        waves: List[List[str]] = []
+        done = set()
+        pending = list(deps)
+        while pending:
+            ready = [t for t in pending if all(d in done for d in deps[t])]
+            if not ready:
+                raise ValueError(f"Dependência cíclica entre as tarefas: {pending}")
+            waves.append(ready)
+            done.update(ready)
+            pending = [t for t in pending if t not in done]
+        return waves
+    
+    def _crew_for(self, task_name: str) -> Crew:
+        """Mini-crew com uma única tarefa (e seu agente)"""
+        task = self.tasks[task_name]
+        return Crew(
+            agents=[task.agent],
+            tasks=[task],
+            process=Process.sequential,
+            verbose=CREW_VERBOSE
+        )
+    
+    async def _run_task(self, task_name: str, user_data: Dict[str, Any]) -> Tuple[str, Any]:
+        return task_name, await self._crew_for(task_name).kickoff_async(inputs=user_data)
+    
+    async def stream_user_data(self, user_data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+        """Executa as tarefas e entrega (tarefa, saída) assim que cada uma termina (progresso/streaming)"""
+        
+        # Executar onda a onda; dentro da onda as tarefas são independentes,
+        # então a latência é max(Lᵢ) em vez de ΣLᵢ. As saídas ficam nos próprios
+        # objetos Task e alimentam o `context` das ondas seguintes
+        async with _CREW_SEMAPHORE:
+            for wave in self.waves:
+                pending = [asyncio.ensure_future(self._run_task(task_name, user_data)) for task_name in wave]
+                try:
+                    for next_done in asyncio.as_completed(pending):
+                        yield await next_done
+                finally:
+                    # Consumidor desistiu (ou erro): não deixa tarefas órfãs rodando
+                    for fut in pending:
+                        fut.cancel()
+    
     async def process_user_data(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Processa dados do usuário através do sistema multi-agente"""
         
-        # Adicionar dados do usuário ao contexto global
-        self.crew.context = user_data
-        
-        # Executar o crew
-        result = await asyncio.to_thread(self.crew.kickoff)
+        # Resultado final = saída da última tarefa do pipeline
+        final_task = self.waves[-1][-1] if self.waves else None
+        result = None
+        async for task_name, output in self.stream_user_data(user_data):
+            if task_name == final_task:
+                result = output
         
         return {
             'recommendations': result,
@@ -4,6 +4,8 @@ import jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import bcrypt
 
@@ -17,6 +19,9 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Security scheme para Bearer token
 security = HTTPBearer()
 
+# bcrypt leva dezenas de ms por hash: roda num pool próprio, fora do event loop
+HASH_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("HASH_WORKERS", "4")), thread_name_prefix="bcrypt")
+
 def hash_password(password: str) -> str:
     """Gera hash da senha usando bcrypt"""
     salt = bcrypt.gensalt()
@@ -26,6 +31,14 @@ def verify_password(password: str, hashed_password: str) -> bool:
     """Verifica se a senha corresponde ao hash"""
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+async def hash_password_async(password: str) -> str:
+    """hash_password no HASH_EXECUTOR (para handlers async)"""
+    return await asyncio.get_running_loop().run_in_executor(HASH_EXECUTOR, hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    """verify_password no HASH_EXECUTOR (para handlers async)"""
+    return await asyncio.get_running_loop().run_in_executor(HASH_EXECUTOR, verify_password, password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Cria token JWT de acesso"""
     to_encode = data.copy()
@@ -1,35 +1,45 @@
-import os
-from pydantic import BaseSettings
-from dotenv import load_dotenv
-
-load_dotenv()
+from functools import lru_cache
+from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
+    # Lido uma única vez do ambiente/.env (campo mysql_user <- MYSQL_USER, etc.)
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
     # Database
-    mysql_user: str = os.getenv("MYSQL_USER")
-    mysql_password: str = os.getenv("MYSQL_PASSWORD")
-    mysql_host: str = os.getenv("MYSQL_HOST")
-    mysql_port: str = os.getenv("MYSQL_PORT")
-    mysql_database: str = os.getenv("MYSQL_DATABASE")
+    mysql_user: Optional[str] = None
+    mysql_password: Optional[str] = None
+    mysql_host: Optional[str] = None
+    mysql_port: Optional[str] = None
+    mysql_database: Optional[str] = None
 
     # Security
-    secret_key: str = os.getenv("SECRET_KEY")
+    secret_key: Optional[str] = None
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
-    
-    # CORS
-    cors_origins: list = ["http://localhost:3000", "http://127.0.0.1:3000"]
-    
+
+    # CORS (conjuntos imutáveis: pertinência O(1), seguros para compartilhar)
+    cors_origins: frozenset[str] = frozenset({"http://localhost:3000", "http://127.0.0.1:3000"})
+
     # LLM Models
-    ollama_models: list = ["llama2", "mistral", "gemma3"]
+    ollama_models: frozenset[str] = frozenset({"llama2", "mistral", "gemma3"})
     default_ollama_model: str = "gemma3"
-    
+
+    # Cache de respostas dos LLMs (desligado por padrão; redis_url vazio: SQLite local)
+    llm_cache_enabled: bool = False
+    redis_url: str = ""
+
+    # Análises CrewAI simultâneas por processo
+    crew_max_parallel: int = 4
+
     # File Upload
     max_file_size: int = 10 * 1024 * 1024  # 10MB
     #allowed_file_types: list = [".csv", ".xlsx", ".xls", ".ofx"]
-    allowed_file_types: list = [".csv"]
-    
-    class Config:
-        env_file = ".env"
+    allowed_file_types: frozenset[str] = frozenset({".csv"})
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Instância única de Settings (também serve como Depends(get_settings) no FastAPI)"""
+    return Settings()
 
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
@@ -0,0 +1,43 @@
+# Testes do BankStatementParserTool (rodar a partir de backend/: python -m pytest tests)
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crew.tools import BankStatementParserTool
+
+
+def _parse(tmp_path, conteudo: str) -> dict:
+    path = tmp_path / "extrato.csv"
+    path.write_text(conteudo, encoding="utf-8")
+    return json.loads(BankStatementParserTool()._run(str(path)))
+
+
+def test_categoria_parcialmente_nula(tmp_path):
+    """Extrato já categorizado com células de categoria vazias não pode quebrar os totais."""
+    out = _parse(tmp_path, (
+        "data,descricao,valor,obs,categoria\n"
+        "05/01/2024,Uber,-10.5,,\n"
+        "31/01/2024,Salario,1000,x,Renda\n"
+        "03/02/2024,Mercado,-20,,Alimentação\n"
+    ))
+    assert out["ok"], out.get("error")
+    assert out["n_transacoes"] == 3
+    assert out["totais_por_categoria"] == [
+        {"categoria": "Alimentação", "valor": -20.0},
+        {"categoria": "Renda", "valor": 1000.0},
+    ]
+
+
+def test_colunas_extras_nulas_viram_null(tmp_path):
+    """Células vazias em colunas repassadas saem como null (não como a string "<NA>")."""
+    out = _parse(tmp_path, (
+        "data,descricao,valor,obs\n"
+        "2024-01-31,Salario,1000,x\n"
+        "2024-01-05,Uber,-10.5,\n"
+    ))
+    assert out["ok"], out.get("error")
+    assert [t["obs"] for t in out["transacoes"]] == [None, "x"]
+    # Ordenadas pela data interpretada, com o texto original preservado
+    assert [t["data"] for t in out["transacoes"]] == ["2024-01-05", "2024-01-31"]